@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Speed/noise autotuner for NPLC, filter and delay settings.
+
+Every combination of settings in a grid is tried on a reference device
+(or a simulated one). For each, the time per reading and the noise (the
+standard deviation of repeated readings) are recorded. The fastest
+settings meeting a target noise floor are saved as a profile. Profiles
+hold sweep parameters (Nplc, DelayFactor, FilterCount, SettleDelay)
+understood by the IV, output and transfer scripts:
+
+    python autotune.py --target 1e-12 --profile low-noise
+    python ofetMeasureCLI.py --sample ofet1 --profile profiles/low-noise.json
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import os
+import json
+import math
+import random
+import itertools
+import click
+
+# Settings tried by default
+GRID = {'Nplc': [0.01, 0.1, 1, 10],
+        'DelayFactor': [0, 1.0],
+        'FilterCount': [0, 5],
+        'SettleDelay': [0.05, 0.2]}
+# Measurements whose scripts take profile settings
+SWEEPS = ('iv-sweep', 'output', 'transfer', 'iv-dual')
+PROFILE_DIR = 'profiles/'
+
+
+class simulatedDevice():
+    """Simple timing and noise model of the 2636 measuring a device.
+
+    Noise falls with the square root of the integration time (NPLC times
+    filter count) down to a floor; time per reading is the settle delay,
+    auto delay and integration time plus a fixed overhead.
+    """
+
+    def __init__(self, current=1e-9, white=2e-12, floor=5e-14,
+                 line_freq=50, overhead=2e-3, auto_delay=5e-3):
+        """Store model parameters."""
+        self.current = current
+        self.white = white
+        self.floor = floor
+        self.line_freq = line_freq
+        self.overhead = overhead
+        self.auto_delay = auto_delay
+
+    def Autotune(self, params):
+        """Return simulated statistics in the same form as K2636.Autotune."""
+        repeats = params.get('Repeats', 20)
+        filt = max(params.get('FilterCount', 0), 1)
+        integration = params['Nplc'] / self.line_freq * filt
+        noise = math.hypot(self.white / math.sqrt(params['Nplc'] * filt),
+                           self.floor)
+        readings = [random.gauss(self.current, noise) for i in range(repeats)]
+        mean = sum(readings) / repeats
+        std = math.sqrt(sum((r - mean) ** 2 for r in readings) /
+                        (repeats - 1))
+        period = (params['SettleDelay'] + self.overhead + integration +
+                  params['DelayFactor'] * self.auto_delay)
+        return {'Mean [A]': mean, 'Noise [A]': std,
+                'Time per point [s]': period}
+
+
+def tune(instrument, grid=GRID, params=None):
+    """Measure every combination of settings in grid.
+
+    instrument is a K2636 or simulatedDevice; params holds fixed script
+    parameters such as the bias point. Returns a DataFrame with one row
+    per combination.
+    """
+    import pandas as pd
+    rows = []
+    names = list(grid)
+    for values in itertools.product(*(grid[n] for n in names)):
+        settings = dict(zip(names, values))
+        result = instrument.Autotune(dict(params or {}, **settings))
+        if result is None:
+            break
+        rows.append(dict(settings, **result))
+    return pd.DataFrame(rows)
+
+
+def recommend(report, target):
+    """Return the fastest settings in a report with noise below target."""
+    ok = report[report['Noise [A]'] <= target]
+    if ok.empty:
+        return None
+    best = ok.sort_values('Time per point [s]').to_dict('records')[0]
+    return {name: best[name] for name in GRID if name in best}
+
+
+def saveProfile(name, settings, path=PROFILE_DIR):
+    """Save settings as a JSON profile and return its file name."""
+    os.makedirs(path, exist_ok=True)
+    fname = os.path.join(path, str(name) + '.json')
+    with open(fname, mode='w') as f:
+        json.dump(settings, f, indent=1)
+    return fname
+
+
+def loadProfile(fname):
+    """Read a profile saved by saveProfile."""
+    with open(str(fname), mode='r') as f:
+        return json.load(f)
+
+
+def applyProfile(profile, measurement, params=None):
+    """Merge a profile into the sweep parameters of one measurement."""
+    if profile is None or measurement not in SWEEPS:
+        return params
+    return dict(profile, **(params or {}))
+
+
+@click.command()
+@click.option('--target', default=1e-12, help='Noise floor to meet [A].')
+@click.option('--profile', default='autotune', help='Name of profile to save.')
+@click.option('--simulate', is_flag=True, help='Tune on a simulated device instead of the keithley.')
+@click.option('--address', default='ASRL/dev/ttyUSB0', help='Instrument address.')
+@click.option('--vchan', default=-10.0, help='Channel voltage of the reference device.')
+@click.option('--vgate', default=0.0, help='Gate voltage of the reference device.')
+def main(target, profile, simulate, address, vchan, vgate):
+    '''Tune measurement settings and save the best as a profile.'''
+    if simulate:
+        instrument = simulatedDevice()
+    else:
+        import k2636
+        instrument = k2636.K2636(address=address)
+    report = tune(instrument, params={'Vchan': vchan, 'Vgate': vgate})
+    if not simulate:
+        instrument.closeConnection()
+
+    report = report.sort_values('Time per point [s]')
+    report.to_csv(str(profile + '-report.csv'), sep='\t', index=False)
+    print(report.to_string(index=False))
+    best = recommend(report, target)
+    if best is None:
+        print('No settings reach a noise of %.2e A.' % target)
+        return
+    print('Fastest settings below %.2e A: %s' % (target, best))
+    print('Saved profile: ', saveProfile(profile, best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark rendering of summary figures, in figures per second.
+
+Synthetic data for a number of samples is written to a temporary folder
+and rendered three ways: a new pyplot figure per sample (as the CLI
+plot does), a reused figureTemplate in one process, and the template on
+a process pool. Run from the repository root:
+
+    python benchmarks/report.py --samples 200
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import os
+import sys
+import time
+import tempfile
+import click
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import report  # noqa: E402
+
+
+def writeSamples(directory, n):
+    """Write iv, output and transfer files for n made-up samples."""
+    v = np.linspace(-60, 60, 241)
+    for i in range(n):
+        sample = os.path.join(directory, 'dev%04d' % i)
+        iv = pd.DataFrame({'Channel Voltage [V]': v,
+                           'Channel Current [A]': v * 1e-8})
+        output = pd.DataFrame({'Channel Voltage [V]': np.tile(v, 4),
+                               'Channel Current [A]': np.tile(v, 4) * 1e-7})
+        for end, sign in (('-neg-pos-transfer.csv', 1),
+                          ('-pos-neg-transfer.csv', -1)):
+            pd.DataFrame({'Gate Voltage [V]': sign * v,
+                          'Channel Current [A]': 1e-11 * np.exp(-v / 8),
+                          'Gate Leakage [A]': v * 1e-12}
+                         ).to_csv(sample + end, sep='\t', index=False)
+        iv.to_csv(sample + '-iv-sweep.csv', sep='\t', index=False)
+        output.to_csv(sample + '-output.csv', sep='\t', index=False)
+
+
+def fromScratch(directory):
+    """Render every sample with a new pyplot figure each time."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    for sample in report.findSamples(directory):
+        df1, df2, df3, df4 = report.readSample(sample)
+        fig = plt.figure(figsize=(10, 8), dpi=80)
+        ax1, ax2, ax3, ax4 = [fig.add_subplot(221 + i) for i in range(4)]
+        ax1.plot(df1['Channel Voltage [V]'], df1['Channel Current [A]'], '.')
+        ax2.plot(df2['Channel Voltage [V]'], df2['Channel Current [A]'], '.')
+        ax3.semilogy(df3['Gate Voltage [V]'], df3['Channel Current [A]'], '.')
+        ax3.semilogy(df4['Gate Voltage [V]'], df4['Channel Current [A]'], '.')
+        ax4.plot(df3['Gate Voltage [V]'], df3['Gate Leakage [A]'], '.')
+        fig.tight_layout()
+        fig.savefig(sample + '.png')
+        plt.close(fig)
+
+
+@click.command()
+@click.option('--samples', default=100, help='Number of samples to render.')
+@click.option('--workers', default=None, type=int, help='Processes in the pool, default one per CPU.')
+def main(samples, workers):
+    '''Compare ways of rendering summary figures.'''
+    with tempfile.TemporaryDirectory() as directory:
+        writeSamples(directory, samples)
+        runs = [('new figure each', lambda: fromScratch(directory)),
+                ('template, 1 process',
+                 lambda: report.renderAll(directory, workers=1)),
+                ('template, pool',
+                 lambda: report.renderAll(directory, workers=workers))]
+        print('%-22s %10s %12s' % ('method', 'time [s]', 'figures/s'))
+        for name, run in runs:
+            begin = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - begin
+            print('%-22s %10.2f %12.1f' % (name, elapsed, samples / elapsed))
+
+
+if __name__ == '__main__':
+    main()
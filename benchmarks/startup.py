@@ -0,0 +1,44 @@
+"""
+Benchmark start-up time of the driver and CLI.
+
+Each module is imported in a fresh interpreter, once on its own (lazy
+imports) and once with the heavy dependencies the modules used to load at
+import time (eager imports). Run from the repository root:
+
+    python benchmarks/startup.py
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import os
+import sys
+import time
+import statistics
+import subprocess
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EAGER = 'import pandas, matplotlib.pyplot, matplotlib.style; '
+MODULES = ['k2636', 'ofetMeasureCLI']
+
+
+def importTime(statement, repeats=5):
+    """Median wall time in seconds to run an import in a new interpreter."""
+    times = []
+    for i in range(repeats):
+        begin = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=REPO,
+                       check=True)
+        times.append(time.perf_counter() - begin)
+    return statistics.median(times)
+
+
+if __name__ == '__main__':
+    baseline = importTime('pass')
+    print('Interpreter start-up: %.3f s' % baseline)
+    print('%-16s %10s %10s %8s' % ('module', 'lazy [s]', 'eager [s]',
+                                   'speed-up'))
+    for module in MODULES:
+        lazy = importTime('import %s' % module)
+        eager = importTime(EAGER + 'import %s' % module)
+        print('%-16s %10.3f %10.3f %7.1fx' % (module, lazy, eager,
+                                              eager / lazy))
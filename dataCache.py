@@ -0,0 +1,193 @@
+"""
+Module for caching parsed data and analysis results on disk.
+
+Results are keyed by a hash of the content of the measurement files
+they come from, plus the kind of result and its parameters, so a file
+that is renamed or copied still hits the cache and an edited file never
+returns stale results. Each result is pickled into its own file in the
+cache folder; reading one marks it as recently used, and the least
+recently used are deleted once the folder grows past its size limit.
+
+    df = dataCache.read('ofet1-output.csv')  # parsed DataFrame
+    df = dataCache.decimated('ofet1-output.csv', 800)  # plot-ready rows
+
+The folder defaults to ~/.cache/k2636, or the K2636_CACHE environment
+variable if set.
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+
+CACHE_DIR = os.environ.get('K2636_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'k2636'))
+MAX_BYTES = 512 * 1024 ** 2  # size limit of the cache folder
+# Column used to pick the points kept when downsampling
+LOD_COLUMNS = ['Channel Current [A]', 'Voltage Out [V]', 'Gate Leakage [A]']
+VERSION = 2  # change to ignore results cached by older code
+
+
+class dataCache():
+    """Size-bounded, least recently used on-disk cache of results."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        """Use directory for cache files, creating it if needed."""
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.hashes = {}  # (path, size, mtime): content hash
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def fileHash(self, fname):
+        """Return a hash of a file's content.
+
+        Hashes are remembered for as long as the file's size and
+        modification time stay the same.
+        """
+        stat = os.stat(str(fname))
+        memo = (os.path.abspath(str(fname)), stat.st_size, stat.st_mtime_ns)
+        if memo not in self.hashes:
+            h = hashlib.sha1()
+            with open(str(fname), mode='rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+            self.hashes[memo] = h.hexdigest()
+        return self.hashes[memo]
+
+    def key(self, fnames, kind, params):
+        """Return the cache key of a result from files with params."""
+        if isinstance(fnames, (str, os.PathLike)):
+            fnames = [fnames]
+        h = hashlib.sha1(json.dumps([VERSION, kind, params], sort_keys=True,
+                                    default=str).encode())
+        for fname in fnames:
+            h.update(self.fileHash(fname).encode())
+        return h.hexdigest()
+
+    def get(self, fnames, kind, compute, **params):
+        """Return a cached result, or compute(fnames, **params) and cache it.
+
+        fnames is a file name or a list of them; kind names the result,
+        e.g. 'read'. Raises FileNotFoundError if a file is missing.
+        """
+        path = os.path.join(self.directory, self.key(fnames, kind, params)
+                            + '.pkl')
+        try:
+            with open(path, mode='rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # mark as recently used
+            self.hits += 1
+            return value
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError):
+            print('CACHE ERROR: Could not read %s, recomputing.' % path)
+        self.misses += 1
+        value = compute(fnames, **params)
+        self.store(path, value)
+        return value
+
+    def store(self, path, value):
+        """Write a result atomically, then keep the folder within size."""
+        tmp = None
+        try:
+            # Unique name, so threads and processes never share a file
+            with tempfile.NamedTemporaryFile(dir=self.directory,
+                                             suffix='.tmp',
+                                             delete=False) as f:
+                tmp = f.name
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError as e:
+            print('CACHE ERROR: Could not save result: %s' % e)
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used results beyond the size limit."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # evicted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Delete every cached result."""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(('.pkl', '.tmp')):
+                os.remove(entry.path)
+
+
+def _read(fname):
+    """Parse a tab-separated data file."""
+    import pandas as pd
+    return pd.read_csv(str(fname), sep='\t')
+
+
+def _decimated(fname, bins):
+    """Parse a data file and keep the rows needed to draw it at bins."""
+    import downsample
+    df = read(fname)
+    for column in LOD_COLUMNS:
+        if column in df:
+            return downsample.decimate(df, column, bins).reset_index(
+                drop=True)
+    return df
+
+
+_cache = None  # cache shared by everything in this process
+
+
+def default():
+    """Return the cache of this process, made on first use."""
+    global _cache
+    if _cache is None:
+        _cache = dataCache()
+    return _cache
+
+
+def read(fname):
+    """Return a data file as a DataFrame, parsed once per content."""
+    return default().get(str(fname), 'read', _read)
+
+
+def decimated(fname, bins):
+    """Return the rows of a data file needed to draw it bins pixels wide."""
+    return default().get(str(fname), 'decimated', _decimated, bins=int(bins))
+
+
+if __name__ == '__main__':
+    """Time reading files with a cold and a warm cache."""
+    import sys
+    import time
+    with tempfile.TemporaryDirectory() as folder:
+        _cache = dataCache(folder)
+        for label in ('cold', 'warm'):
+            _cache.hashes.clear()  # as in a new session
+            start = time.perf_counter()
+            for fname in sys.argv[1:]:
+                decimated(fname, 800)
+            print('%s: %.3f s' % (label, time.perf_counter() - start))
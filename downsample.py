@@ -0,0 +1,81 @@
+"""
+Module for reducing measurement data to what can usefully be drawn.
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import numpy as np
+
+
+def lodIndices(y, bins):
+    """Return indices of the min and max point in each of bins chunks of y.
+
+    Keeping both extremes of every chunk preserves the envelope of a curve
+    at screen resolution, whatever the number of points. The point nearest
+    zero in each chunk is kept too, so curves drawn as |y| on a log axis,
+    such as transfer curves, keep their floor.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    bins = int(bins)
+    if bins < 1 or n <= 2 * bins:
+        return np.arange(n)
+    chunk = -(-n // bins)  # ceiling division
+    bins = -(-n // chunk)
+    padded = np.full(bins * chunk, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(bins, chunk)
+    offsets = np.arange(bins) * chunk
+    lo = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    hi = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    near = np.argmin(np.where(np.isnan(padded), np.inf, abs(padded)), axis=1)
+    keep = np.unique(np.concatenate([lo + offsets, hi + offsets,
+                                     near + offsets]))
+    return keep[keep < n]
+
+
+def decimate(df, column, bins):
+    """Return the rows of a DataFrame needed to draw column at bins pixels."""
+    if column not in df:
+        return df
+    return df.iloc[lodIndices(df[column].values, bins)]
+
+
+class logView():
+    """Running summary of a signal against log(time) in fixed memory.
+
+    Time from tmin to tmax is split into per_decade bins per decade, and
+    each bin keeps the number, sum, min and max of the points falling in
+    it. Points before tmin or after tmax go into the first or last bin, so
+    memory use does not grow however long a measurement runs.
+    """
+
+    def __init__(self, tmin=0.1, tmax=1e6, per_decade=50):
+        """Make empty bins."""
+        n = int(round(np.log10(tmax / tmin) * per_decade))
+        self.edges = np.logspace(np.log10(tmin), np.log10(tmax), n + 1)
+        self.count = np.zeros(n)
+        self.total = np.zeros(n)
+        self.lo = np.full(n, np.inf)
+        self.hi = np.full(n, -np.inf)
+
+    def add(self, t, y):
+        """Add points y measured at times t [s]."""
+        t = np.asarray(t, dtype=float)
+        y = np.asarray(y, dtype=float)
+        idx = np.clip(np.searchsorted(self.edges, t, side='right') - 1,
+                      0, len(self.count) - 1)
+        np.add.at(self.count, idx, 1)
+        np.add.at(self.total, idx, y)
+        np.minimum.at(self.lo, idx, y)
+        np.maximum.at(self.hi, idx, y)
+
+    def frame(self, column='Channel Current [A]'):
+        """Return the filled bins as a DataFrame for plotting."""
+        import pandas as pd
+        full = self.count > 0
+        centres = np.sqrt(self.edges[:-1] * self.edges[1:])
+        return pd.DataFrame({'Time [s]': centres[full],
+                             column: self.total[full] / self.count[full],
+                             'Min': self.lo[full],
+                             'Max': self.hi[full]})
@@ -0,0 +1,218 @@
+"""
+Module for measurement job files and a persistent record of completed steps.
+
+A step is one (sample, measurement, direction) combination, e.g.
+('ofet1', 'transfer', 'neg-pos'). Each finished step is written to a JSON
+file on disk together with the data file it produced, so an interrupted
+run can be restarted and the finished steps skipped.
+
+Job files list the samples to measure, in YAML:
+
+    address: ASRL/dev/ttyUSB0
+    jobs:
+      - sample: ofet1
+        measurements: [iv-sweep, transfer]
+        params:
+          transfer: {VgStart: -60, VgEnd: 60}
+
+or CSV, with sweep parameters in '<measurement>.<parameter>' columns:
+
+    sample,measurements,address,transfer.VgStart,transfer.VgEnd
+    ofet1,iv-sweep transfer,ASRL/dev/ttyUSB0,-60,60
+
+An iv-dual measurement sweeps the job's sample on smua and a second
+device, given as sampleB, on smub at the same time. As smub is then not
+a gate, jobs with iv-dual are never pre-screened.
+
+Jobs may also set plot and prescreen (true or false) and a settings
+profile from autotune.py, and give limits for the pre-screen under params
+as for a measurement. Only jobs with transistor sweeps (iv-sweep, output
+or transfer) are pre-screened. The channel length and width of the
+device, in um, can be given as length and width, and its place on the
+substrate as substrate, row and column; they are saved in the sample's
+info file (see sampleInfo.py) for TLM extraction and wafer maps. A job
+with a position but no sample name is named like W01-R03-C12.
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import os
+import csv
+import json
+import time
+import sampleInfo
+
+MEASUREMENTS = ('iv-sweep', 'output', 'transfer', 'inverter', 'iv-dual')
+# Measurements of a transistor wired as the pre-screen expects
+TRANSISTOR_SWEEPS = ('iv-sweep', 'output', 'transfer')
+DEFAULT_ADDRESS = 'ASRL/dev/ttyUSB0'
+
+
+class jobQueue():
+    """Persistent, checkpointed record of measurement steps."""
+
+    def __init__(self, path='measurement-queue.json'):
+        """Load any existing record from disk."""
+        self.path = str(path)
+        self.steps = []
+        self.load()
+
+    def load(self):
+        """Read the queue file, starting afresh if there isn't one."""
+        try:
+            with open(self.path, mode='r') as f:
+                self.steps = json.load(f)['steps']
+        except FileNotFoundError:
+            self.steps = []
+        except (ValueError, KeyError):
+            print('QUEUE ERROR: Could not read %s, starting new queue.'
+                  % self.path)
+            self.steps = []
+
+    def save(self):
+        """Write the queue file atomically so a crash can't corrupt it."""
+        tmp = self.path + '.tmp'
+        with open(tmp, mode='w') as f:
+            json.dump({'steps': self.steps}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def isDone(self, sample, measurement, direction=''):
+        """Return True if a step finished and its output is still on disk."""
+        for step in self.steps:
+            if (step['sample'] == sample and
+                    step['measurement'] == measurement and
+                    step['direction'] == direction):
+                return os.path.isfile(step['output'])
+        return False
+
+    def markDone(self, sample, measurement, direction, output, **info):
+        """Record a finished step and checkpoint to disk.
+
+        Any extra keyword arguments, e.g. why a sweep stopped, are stored
+        with the step.
+        """
+        self.steps = [s for s in self.steps
+                      if not (s['sample'] == sample and
+                              s['measurement'] == measurement and
+                              s['direction'] == direction)]
+        step = {'sample': sample,
+                'measurement': measurement,
+                'direction': direction,
+                'output': str(output),
+                'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+        step.update(info)
+        self.steps.append(step)
+        self.save()
+
+    def clear(self, sample=None):
+        """Forget finished steps, for one sample or for all of them."""
+        if sample is None:
+            self.steps = []
+        else:
+            self.steps = [s for s in self.steps if s['sample'] != sample]
+        self.save()
+
+
+def _number(value):
+    """Convert a CSV cell to bool, int or float where possible."""
+    if value.lower() in ('true', 'yes'):
+        return True
+    if value.lower() in ('false', 'no'):
+        return False
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _readYAML(path):
+    """Read a YAML job file."""
+    import yaml  # only needed for YAML job files
+    with open(path, mode='r') as f:
+        spec = yaml.safe_load(f) or {}
+    if isinstance(spec, list):
+        spec = {'jobs': spec}
+    jobs = []
+    for entry in spec.get('jobs', []):
+        job = dict(entry)
+        job['sample'] = str(job.get('sample') or '')
+        job.setdefault('address', spec.get('address', DEFAULT_ADDRESS))
+        job.setdefault('measurements',
+                       spec.get('measurements', ['iv-sweep', 'output',
+                                                 'transfer']))
+        job.setdefault('params', {})
+        jobs.append(job)
+    return jobs
+
+
+def _readCSV(path):
+    """Read a CSV job file."""
+    jobs = []
+    with open(path, mode='r', newline='') as f:
+        for row in csv.DictReader(f):
+            job = {'sample': (row.pop('sample', '') or '').strip(),
+                   'address': row.pop('address', '') or DEFAULT_ADDRESS,
+                   'measurements': (row.pop('measurements', '') or
+                                    'iv-sweep output transfer'
+                                    ).replace(';', ' ').split(),
+                   'params': {}}
+            for column, value in row.items():
+                if value is None or value.strip() == '':
+                    continue
+                measurement, _, name = column.strip().partition('.')
+                if name:
+                    job['params'].setdefault(measurement, {})[name] = \
+                        _number(value.strip())
+                else:  # job option such as plot or prescreen
+                    job[measurement] = _number(value.strip())
+            jobs.append(job)
+    return jobs
+
+
+def readJobFile(path):
+    """Read a YAML or CSV job file and return a list of job dicts.
+
+    Each job has 'sample', 'address', 'measurements' and 'params' keys,
+    where params maps a measurement name to its TSP parameter overrides.
+    """
+    path = str(path)
+    if path.endswith('.csv'):
+        jobs = _readCSV(path)
+    else:
+        jobs = _readYAML(path)
+    for job in jobs:
+        if not job.get('sample') and all(job.get(key) is not None for key
+                                         in ('substrate', 'row', 'column')):
+            job['sample'] = sampleInfo.deviceName(
+                job['substrate'], job['row'], job['column'])
+        if not job.get('sample'):
+            raise ValueError('Job without a sample name in %s' % path)
+        for measurement in job['measurements']:
+            if measurement not in MEASUREMENTS:
+                raise ValueError('Unknown measurement %s for sample %s'
+                                 % (measurement, job['sample']))
+            if measurement == 'iv-dual' and not job.get('sampleB'):
+                raise ValueError('No sampleB for iv-dual of sample %s'
+                                 % job['sample'])
+        if job.get('sampleB'):
+            job['sampleB'] = str(job['sampleB'])
+    return jobs
+
+
+def prescreened(job, default=True):
+    """Return True if a job should be pre-screened before measuring."""
+    measurements = job['measurements']
+    return (job.get('prescreen', default) and 'iv-dual' not in measurements
+            and any(m in TRANSISTOR_SWEEPS for m in measurements))
+
+
+if __name__ == '__main__':
+    """Print the contents of a queue file."""
+    queue = jobQueue()
+    for step in queue.steps:
+        print(step['time'], step['sample'], step['measurement'],
+              step['direction'], step['output'])
@@ -1,16 +1,43 @@
 """
 Module for interacting with the Keithley 2636B SMU.
 
+pyvisa, pandas and matplotlib are imported when first needed so that
+scripts using the driver start quickly.
+
 Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
 """
 
-import visa
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.style as style
 import time
+import tsp
+import stream
+import transport
+import sampleInfo
 from serial import SerialException
 
+# Empties the error queue and prints every entry on one line
+DRAIN_ERRORS = ('ErrorList = {} while errorqueue.count > 0 do '
+                'local code, message = errorqueue.next() '
+                'table.insert(ErrorList, string.format("%d\t%s", code, '
+                'message)) end print(table.concat(ErrorList, "|"))')
+# Prints the errors of the last drain again, for a retried read
+REPRINT_ERRORS = 'print(ErrorList and table.concat(ErrorList, "|") or "")'
+# Values StopReason can take, see include/abort-rules.tsp
+STOP_REASONS = ('complete', 'compliance', 'gate leakage', 'open circuit')
+EAV = 4  # error available bit of the status byte
+MAV = 16  # message available bit of the status byte
+RETRIES = 4  # attempts at reading each chunk of a buffer
+BACKOFF = 0.5  # s, wait before the first retry, doubled after each
+CHUNK = 500  # values per printbuffer call
+
+
+class InstrumentError(Exception):
+    """The keithley reported errors, e.g. from a failed script."""
+
+    def __init__(self, errors):
+        """Store (code, message) pairs from the error queue."""
+        self.errors = errors
+        super().__init__('; '.join('%d %s' % e for e in errors))
+
 
 class K2636():
     """Class for Keithley control."""
@@ -18,26 +45,102 @@ class K2636():
     def __init__(self, address='ASRL/dev/ttyUSB0', read_term='\n',
                  baudrate=57600):
         """Make instrument connection instantly on calling class."""
-        rm = visa.ResourceManager('@py')  # use py-visa backend
-        self.makeConnection(rm, address, read_term, baudrate)
-
-    def makeConnection(self, rm, address, read_term, baudrate):
-        """Make initial connection to instrument."""
+        self.stopReason = 'complete'  # why the last sweep ended
+        self.errors = []  # everything read from the error queue
+        self.scriptPending = False  # a script ran and is not yet checked
+        self.monitor = None  # liveMonitor to publish progress to, if any
+        self.script = None  # name of the last script loaded
+        self.info = {}  # device details saved with every measurement
+        self.finished = 0  # steps saved, or found done in the job queue
+        self.makeConnection(address, read_term, baudrate)
+
+    def makeConnection(self, address, read_term, baudrate):
+        """Make initial connection to instrument.
+
+        The kind of link (serial, raw socket, GPIB or VXI-11) follows from
+        the address, see transport.py.
+        """
         try:
-            if 'ttyS' or 'ttyUSB' in str(address):
-                # Connection via SERIAL
-                self.inst = rm.open_resource(address)
-                self.inst.read_termination = str(read_term)
-                self.inst.baud_rate = baudrate
-
-            if 'GPIB' in str(address):
-                # Connection via GPIB
-                print('No GPIB support. Please use serial')
+            self.inst = transport.openTransport(address, read_term, baudrate)
 
-        except SerialException:
+        except (SerialException, OSError, ValueError):
             print("CONNECTION ERROR: Check instrument address.")
             raise ConnectionError
 
+    def waitScript(self, interval=0.2):
+        """Wait for the running script by polling the status byte.
+
+        Only links that can read the status byte while a script runs
+        (GPIB, VXI-11) support this. A reply queued behind the script
+        sets the message available bit once it ends; if the error
+        available bit comes first, the script is aborted with a device
+        clear.
+        """
+        token = 'done%d' % int(time.time() * 1000)
+        self.inst.write('print("%s")' % token)
+        while True:
+            status = self.inst.read_stb()
+            if status & EAV:
+                print('Error reported during script, aborting.')
+                self.inst.clear()
+                return
+            if status & MAV and self.inst.read().strip() == token:
+                return
+            if not status & MAV:
+                time.sleep(interval)
+
+    def _publish(self, event, **data):
+        """Send an event to the live monitor, if there is one.
+
+        A failing monitor is reported but never stops a measurement.
+        """
+        if self.monitor is not None:
+            try:
+                self.monitor.publish(event, **data)
+            except Exception as e:
+                print('MONITOR ERROR: Could not publish %s (%s: %s).'
+                      % (event, type(e).__name__, e))
+
+    def readErrors(self):
+        """Empty the instrument error queue in one query.
+
+        Returns a list of (code, message) pairs, oldest first. A failed
+        read is retried by printing the drained errors again, so none
+        are lost.
+        """
+        drained = []
+
+        def read():
+            command = REPRINT_ERRORS if drained else DRAIN_ERRORS
+            drained.append(True)
+            reply = self.inst.query(command).strip()
+            errors = []
+            for entry in reply.split('|') if reply else []:
+                code, _, message = entry.partition('\t')
+                errors.append((int(float(code)), message.strip()))
+            return errors
+        return self._retry(read, 'error queue')
+
+    def checkErrors(self):
+        """Raise InstrumentError if the last script left any errors.
+
+        Waits for a running script to end first, polling the status byte
+        where the link allows it.
+        """
+        try:
+            if getattr(self.inst, 'polling', False):
+                self.waitScript()
+            errors = self.readErrors()
+        finally:
+            self.scriptPending = False
+        if errors:
+            self.errors.extend(errors)
+            for code, message in errors:
+                print('INSTRUMENT ERROR %d: %s' % (code, message))
+            self._publish('error', status='error',
+                          errors=['%d %s' % e for e in errors])
+            raise InstrumentError(errors)
+
     def closeConnection(self):
         """Close connection to keithley."""
         try:
@@ -63,8 +166,14 @@ class K2636():
         return r
 
     def _query(self, s):
-        """Query instrument."""
+        """Query instrument.
+
+        The first query after a script runs waits for it to finish and
+        checks the error queue first.
+        """
         try:
+            if self.scriptPending:
+                self.checkErrors()
             r = self.inst.query(s)
             return r
         except SerialException:
@@ -75,18 +184,22 @@ class K2636():
             print('CONNECTION ERROR: No connection established.')
             return ('CONNECTION ERROR: No connection established.')
 
-    def loadTSP(self, tsp):
-        """Load an anonymous TSP script into the K2636 nonvolatile memory."""
+    def loadTSP(self, script, params=None):
+        """Load an anonymous TSP script into the K2636 nonvolatile memory.
+
+        params is an optional dict overriding the PARAMETERS in the script.
+        """
         try:
-            tsp_dir = 'TSP-scripts/'  # Put all tsp scripts in this folder
+            lines = tsp.read_tsp(script)
+            if params:
+                lines = tsp.set_params(lines, params)
             self._write('loadscript')
-            line_count = 1
-            for line in open(str(tsp_dir + tsp), mode='r'):
+            for line in lines:
                 self._write(line)
-                line_count += 1
             self._write('endscript')
+            self.script = script
             print('----------------------------------------')
-            print('Uploaded TSP script: ', tsp)
+            print('Uploaded TSP script: ', script)
 
         except FileNotFoundError:
             print('ERROR: Could not find tsp script. Check path.')
@@ -94,55 +207,176 @@ class K2636():
 
     def runTSP(self):
         """Run the anonymous TSP script currently loaded in the K2636 memory."""
+        self.stopReason = 'complete'
         self._write('script.anonymous.run()')
+        self.scriptPending = True
+        self._publish('status', status='running %s' % self.script)
         print('Measurement in progress...')
 
-    def readBuffer(self):
-        """Read buffer in memory and return an array."""
+    def _ask(self, command, parse):
+        """Query a short reply, retried like buffer reads.
+
+        parse turns the reply into the value returned, raising ValueError
+        if it is garbled.
+        """
+        if self.scriptPending:
+            self.checkErrors()
+        return self._retry(lambda: parse(self.inst.query(command).strip()),
+                           command)
+
+    def _readNplcLog(self, n):
+        """Return the NPLC used for each of n readings, if it was logged."""
+        def parse(reply):
+            if not reply:
+                return None
+            nplc = [float(x) for x in reply.split(',')]
+            if len(nplc) != n:
+                raise ValueError('%d of %d values' % (len(nplc), n))
+            return nplc
         try:
-            vg = [float(x) for x in self._query('printbuffer' +
-                  '(1, smub.nvbuffer1.n, smub.nvbuffer1.sourcevalues)').split(',')]
-            ig = [float(x) for x in self._query('printbuffer' +
-                  '(1, smub.nvbuffer1.n, smub.nvbuffer1.readings)').split(',')]
-            vd = [float(x) for x in self._query('printbuffer' +
-                  '(1, smua.nvbuffer1.n, smua.nvbuffer1.sourcevalues)').split(',')]
-            c = [float(x) for x in self._query('printbuffer' +
-                 '(1, smua.nvbuffer1.n, smua.nvbuffer1.readings)').split(',')]
-
-            df = pd.DataFrame({'Gate Voltage [V]': vg,
-                               'Channel Voltage [V]': vd,
-                               'Channel Current [A]': c,
-                               'Gate Leakage [A]': ig})
-            return df
+            return self._ask('print(NplcLog and table.concat(NplcLog, ",") '
+                             'or "")', parse)
+        except ConnectionError as e:
+            print('READ ERROR: %s Saving without the NPLC column.' % e)
+            return None
+
+    def _resync(self):
+        """Discard stale or partial replies after a failed read."""
+        self.inst.clear()
+        token = 'sync%d' % int(time.time() * 1000)
+        self.inst.write('print("%s")' % token)
+        for i in range(10):
+            if self.inst.read().strip() == token:
+                return
+
+    def _retry(self, read, what):
+        """Return read(), retrying with back-off after a failed read.
+
+        A timeout, serial error or garbled reply is followed by a wait
+        (doubling each time) and a resynchronisation before the next
+        attempt. Raises ConnectionError after RETRIES attempts; the data
+        is still in the instrument buffers at that point.
+        """
+        for attempt in range(RETRIES):
+            try:
+                return read()
+            except (OSError, ValueError) as e:
+                wait = BACKOFF * 2 ** attempt
+                print('READ ERROR: %s (%s). Retry %d of %d in %.1f s.'
+                      % (what, e, attempt + 1, RETRIES, wait))
+                time.sleep(wait)
+                try:
+                    self._resync()
+                except (OSError, ValueError):
+                    pass
+        raise ConnectionError('Could not read %s.' % what)
+
+    def readField(self, buf, field, binary=False):
+        """Read one field of an instrument buffer, e.g. smua.nvbuffer1.readings.
+
+        The buffer is read CHUNK values at a time with printbuffer(i, j,
+        ...), so a glitch only costs a re-read of that chunk, and the
+        number of values is checked against the buffer length n. With
+        binary=True the values are sent as REAL64, as set up by
+        inverter-transient.tsp.
+        """
+        if self.scriptPending:
+            self.checkErrors()
+        n = self._retry(lambda: int(float(self.inst.query('print(%s.n)'
+                                                          % buf))),
+                        buf + '.n')
+        values = []
+        for i in range(1, n + 1, CHUNK):
+            j = min(i + CHUNK - 1, n)
+            command = 'printbuffer(%d, %d, %s.%s)' % (i, j, buf, field)
+
+            def read():
+                if binary:
+                    chunk = list(self.inst.query_binary_values(
+                        command, datatype='d', is_big_endian=False,
+                        header_fmt='ieee', data_points=j - i + 1))
+                else:
+                    chunk = [float(x)
+                             for x in self.inst.query(command).split(',')]
+                if len(chunk) != j - i + 1:
+                    raise ValueError('%d of %d values'
+                                     % (len(chunk), j - i + 1))
+                return chunk
+            values += self._retry(read, command)
+        return values
 
-        except SerialException:
-            print('Cannot read buffer.')
-            return
-
-    def readBufferIV(self):
-        """Read specified buffer in keithley memory and return an array."""
-        vd = [float(x) for x in self._query('printbuffer' +
-              '(1, smua.nvbuffer1.n, smua.nvbuffer1.sourcevalues)').split(',')]
-        c = [float(x) for x in self._query('printbuffer' +
-             '(1, smua.nvbuffer1.n, smua.nvbuffer1.readings)').split(',')]
-        df = pd.DataFrame({'Channel Voltage [V]': vd, 'Channel Current [A]': c})
+    def readBuffer(self):
+        """Read buffer in memory and return an array."""
+        import pandas as pd
+        vg = self.readField('smub.nvbuffer1', 'sourcevalues')
+        ig = self.readField('smub.nvbuffer1', 'readings')
+        vd = self.readField('smua.nvbuffer1', 'sourcevalues')
+        c = self.readField('smua.nvbuffer1', 'readings')
+
+        df = pd.DataFrame({'Gate Voltage [V]': vg,
+                           'Channel Voltage [V]': vd,
+                           'Channel Current [A]': c,
+                           'Gate Leakage [A]': ig})
+        self._publish('points', x=vg, y=c, new=True)
+        nplc = self._readNplcLog(len(df))
+        if nplc is not None:
+            df['NPLC'] = nplc
         return df
-    
+
+    def readBufferIV(self, dual=False):
+        """Read specified buffer in keithley memory and return an array.
+
+        With dual=True the smub buffer of a dual-channel sweep is read too
+        and a DataFrame is returned for each channel, smua first.
+        """
+        import pandas as pd
+        smus = ['smua', 'smub'] if dual else ['smua']
+        dfs = []
+        for smu in smus:
+            vd = self.readField(smu + '.nvbuffer1', 'sourcevalues')
+            c = self.readField(smu + '.nvbuffer1', 'readings')
+            dfs.append(pd.DataFrame({'Channel Voltage [V]': vd,
+                                     'Channel Current [A]': c}))
+            self._publish('points', x=vd, y=c, new=True)
+        nplc = self._readNplcLog(len(dfs[0]))
+        if nplc is not None:
+            for df in dfs:
+                df['NPLC'] = nplc
+        return tuple(dfs) if dual else dfs[0]
+
     def readBufferInverter(self):
         """Read specified buffer for inverter measurement."""
-        SMUAsrc = [float(x) for x in self._query('printbuffer' +
-              '(1, smua.nvbuffer1.n, smua.nvbuffer1.sourcevalues)').split(',')]
-        SMUAread = [float(x) for x in self._query('printbuffer' +
-             '(1, smua.nvbuffer1.n, smua.nvbuffer1.readings)').split(',')]
-        SMUBsrc = [float(x) for x in self._query('printbuffer' +
-             '(1, smub.nvbuffer1.n, smub.nvbuffer1.sourcevalues)').split(',')]
-        SMUBread = [float(x) for x in self._query('printbuffer' +
-             '(1, smub.nvbuffer1.n, smub.nvbuffer1.readings)').split(',')]        
+        import pandas as pd
+        SMUAsrc = self.readField('smua.nvbuffer1', 'sourcevalues')
+        SMUAread = self.readField('smua.nvbuffer1', 'readings')
+        SMUBsrc = self.readField('smub.nvbuffer1', 'sourcevalues')
+        SMUBread = self.readField('smub.nvbuffer1', 'readings')
         df = pd.DataFrame({'Voltage In [V]': SMUAread, 'Voltage Out [V]': SMUBread, 'SMUA source': SMUAsrc, 'SMUB source': SMUBsrc})
-        return df    
+        return df
+
+    def readBufferTransient(self):
+        """Read timestamped input and output voltages in binary format.
+
+        Input and output times share the origin of the input sampling.
+        """
+        import pandas as pd
+        import numpy as np
+        offset = self._ask('print(string.format("%.9f", Offset))', float)
+        data = {}
+        for smu, name in (('smua', 'In'), ('smub', 'Out')):
+            t = np.array(self.readField(smu + '.nvbuffer1', 'timestamps',
+                                        binary=True))
+            v = np.array(self.readField(smu + '.nvbuffer1', 'readings',
+                                        binary=True))
+            data['Time %s [s]' % name] = t + (offset if smu == 'smub' else 0)
+            data['Voltage %s [V]' % name] = v
+        return pd.DataFrame(data)
 
     def DisplayMeasurement(self, sample):
         """Show graphs of measurements."""
+        import pandas as pd
+        import matplotlib.pyplot as plt
+        import matplotlib.style as style
         try:
             style.use('ggplot')
             fig, ([ax1, ax2], [ax3, ax4]) = plt.subplots(2, 2, figsize=(20, 10),
@@ -184,15 +418,112 @@ class K2636():
         except(FileNotFoundError):
             print('Sample name not found.')
 
-    def IVsweep(self, sample):
+    def _skip(self, queue, sample, measurement, direction=''):
+        """Check the job queue for a step that has already been measured."""
+        if queue is not None and queue.isDone(sample, measurement, direction):
+            print('Skipping completed step: ', sample, measurement, direction)
+            self.finished += 1
+            return True
+        return False
+
+    def _record(self, sample, measurement, direction, output_name):
+        """Save device details and the new data file in the sample info."""
+        sampleInfo.record(sample, measurement, direction, output_name,
+                          self.info, stopped=self.stopReason)
+
+    def _checkpoint(self, queue, sample, measurement, direction, output_name):
+        """Record a finished step, and why its sweep ended, in the queue."""
+        self._record(sample, measurement, direction, output_name)
+        self.finished += 1
+        self._publish('done', status='finished %s %s %s'
+                      % (sample, measurement, direction),
+                      output=output_name, stopped=self.stopReason)
+        if queue is not None:
+            queue.markDone(sample, measurement, direction, output_name,
+                           stopped=self.stopReason)
+
+    def _readStopReason(self):
+        """Ask the instrument why the last sweep ended.
+
+        Sweeps stop early when one of the abort rules in
+        include/abort-rules.tsp is enabled and triggered; the readings
+        taken up to that point stay in the buffer and are saved as usual.
+        """
+        def parse(reply):
+            if reply not in STOP_REASONS:
+                raise ValueError('unknown stop reason %r' % reply)
+            return reply
+        self.stopReason = self._ask('print(StopReason or "complete")', parse)
+        if self.stopReason != 'complete':
+            print('Sweep stopped early: %s. Partial data kept.'
+                  % self.stopReason)
+        return self.stopReason
+
+    def Prescreen(self, sample, params=None):
+        """K2636 fast pre-screen, returning the on-instrument verdict.
+
+        Returns a dict with 'Verdict' (pass, open, short or leaky) and the
+        on, off and gate leakage currents the verdict was based on.
+        """
+        try:
+            begin_time = time.time()
+            self.loadTSP('prescreen.tsp', params)
+            self.runTSP()
+            def parse(reply):
+                verdict, ion, ioff, ig = reply.split(',')
+                if verdict not in ('pass', 'open', 'short', 'leaky'):
+                    raise ValueError('unknown verdict %r' % verdict)
+                return {'Verdict': verdict,
+                        'On Current [A]': float(ion),
+                        'Off Current [A]': float(ioff),
+                        'Gate Leakage [A]': float(ig)}
+            result = self._ask('print(Result)', parse)
+            verdict = result['Verdict']
+            output_name = str(sample + '-prescreen.csv')
+            with open(output_name, mode='w') as f:
+                f.write('\t'.join(result) + '\n')
+                f.write('\t'.join(str(v) for v in result.values()) + '\n')
+            finish_time = time.time()
+            print('Pre-screen complete: %s. Elapsed time %.2f s.'
+                  % (verdict, finish_time - begin_time))
+            return result
+
+        except(AttributeError):
+            print('Cannot perform pre-screen: no keithley connected.')
+
+    def Autotune(self, params=None):
+        """K2636 repeated readings for tuning speed against noise.
+
+        Returns the mean and standard deviation of the channel current and
+        the time taken per reading with the settings given in params.
+        """
+        try:
+            self.loadTSP('autotune.tsp', params)
+            self.runTSP()
+            def parse(reply):
+                mean, std, period = [float(x) for x in reply.split(',')]
+                return mean, std, period
+            mean, std, period = self._ask('print(Result)', parse)
+            return {'Mean [A]': mean,
+                    'Noise [A]': std,
+                    'Time per point [s]': period}
+
+        except(AttributeError):
+            print('Cannot perform autotune: no keithley connected.')
+
+    def IVsweep(self, sample, queue=None, params=None):
         """K2636 IV sweep."""
         try:
             begin_time = time.time()
-            self.loadTSP('iv-sweep.tsp')
+            if self._skip(queue, sample, 'iv-sweep'):
+                return
+            self.loadTSP('iv-sweep.tsp', params)
             self.runTSP()
             df = self.readBufferIV()
+            self._readStopReason()
             output_name = str(sample + '-iv-sweep.csv')
             df.to_csv(output_name, sep='\t', index=False)
+            self._checkpoint(queue, sample, 'iv-sweep', '', output_name)
             finish_time = time.time()
             print('IV sweep complete. Elapsed time %.2f mins.'
                   % ((finish_time - begin_time)/60))
@@ -200,15 +531,72 @@ class K2636():
         except(AttributeError):
             print('Cannot perform IV sweep: no keithley connected.')
 
-    def Output(self, sample):
-        """K2636 Output sweeps."""
+    def IVsweepDual(self, sampleA, sampleB, queue=None, params=None):
+        """K2636 IV sweeps of two devices at once, on smua and smub."""
         try:
             begin_time = time.time()
-            self.loadTSP('output-charact.tsp')
+            if (self._skip(queue, sampleA, 'iv-sweep') and
+                    self._skip(queue, sampleB, 'iv-sweep')):
+                return
+            self.loadTSP('iv-sweep-dual.tsp', params)
+            self.runTSP()
+            dfs = self.readBufferIV(dual=True)
+            for sample, df in zip((sampleA, sampleB), dfs):
+                output_name = str(sample + '-iv-sweep.csv')
+                df.to_csv(output_name, sep='\t', index=False)
+                self._checkpoint(queue, sample, 'iv-sweep', '', output_name)
+            finish_time = time.time()
+            print('Dual IV sweep complete. Elapsed time %.2f mins.'
+                  % ((finish_time - begin_time)/60))
+
+        except(AttributeError):
+            print('Cannot perform IV sweep: no keithley connected.')
+
+    def Output(self, sample, queue=None, params=None, planned=True):
+        """K2636 Output sweeps.
+
+        With planned=True the points are measured in the order worked out
+        by scanPlanner (serpentine Vd sweeps, waits sized to each voltage
+        step) and put back in the usual order before saving.
+        """
+        import scanPlanner
+        try:
+            begin_time = time.time()
+            if self._skip(queue, sample, 'output'):
+                return
+            if planned:
+                settings = dict(scanPlanner.PLANNER)
+                script = {}
+                for name, value in (params or {}).items():
+                    if name in settings:
+                        settings[name] = value
+                    elif name not in scanPlanner.LEVELS:
+                        script[name] = value
+                vg, vd = scanPlanner.levels(params)
+                plan = scanPlanner.plan(vg, vd, True, settings['SettleDelay'],
+                                        settings['GateSettle'],
+                                        settings['DrainSettle'])
+                if 'NplcTable' in script:  # given in the usual order
+                    script['NplcTable'] = [script['NplcTable'][k]
+                                           for k in plan['Order']
+                                           if k < len(script['NplcTable'])]
+                script.update(PlanVg=plan['Vg'], PlanVd=plan['Vd'],
+                              PlanWait=plan['Wait'])
+                naive = scanPlanner.naiveTime(vg, vd, settings['SettleDelay'])
+                print('Planned output scan: %.0f s of settling instead of '
+                      '%.0f s, %.0f s saved.'
+                      % (sum(plan['Wait']), naive, naive - sum(plan['Wait'])))
+                self.loadTSP('output-planned.tsp', script)
+            else:
+                self.loadTSP('output-charact.tsp', params)
             self.runTSP()
             df = self.readBuffer()
+            if planned:
+                df = scanPlanner.restore(df, plan['Order'])
+            self._readStopReason()
             output_name = str(sample + '-output.csv')
             df.to_csv(output_name, sep='\t', index=False)
+            self._checkpoint(queue, sample, 'output', '', output_name)
             finish_time = time.time()
             print('Output sweeps complete. Elapsed time %.2f mins.'
                   % ((finish_time - begin_time) / 60))
@@ -216,22 +604,66 @@ class K2636():
         except(AttributeError):
             print('Cannot perform output sweep: no keithley connected.')
 
-    def Transfer(self, sample):
-        """K2636 Transfer sweeps."""
+    def _splitSweep(self, df):
+        """Split a double sweep buffer into forward and reverse parts."""
+        def parse(reply):
+            n = int(float(reply))
+            if not 0 <= n <= len(df):
+                raise ValueError('%d forward points of %d' % (n, len(df)))
+            return n
+        n = self._ask('print(Nfwd)', parse)
+        return (df.iloc[:n].reset_index(drop=True),
+                df.iloc[n:].reset_index(drop=True))
+
+    def Transfer(self, sample, queue=None, params=None, double=True):
+        """K2636 Transfer sweeps.
+
+        With double=True both sweep directions are measured by a single
+        script, sharing one reset, buffer setup and settle delay.
+        """
         try:
             begin_time = time.time()
-            self.loadTSP('transfer-charact.tsp')
-            self.runTSP()
-            df = self.readBuffer()
-            output_name = str(sample + '-neg-pos-transfer.csv')
-            df.to_csv(output_name, sep='\t', index=False)
+            forward = not self._skip(queue, sample, 'transfer', 'neg-pos')
+            reverse = not self._skip(queue, sample, 'transfer', 'pos-neg')
+            if double and forward and reverse:
+                self.loadTSP('transfer-double.tsp', params)
+                self.runTSP()
+                dfs = self._splitSweep(self.readBuffer())
+                self._readStopReason()
+                for direction, df in zip(('neg-pos', 'pos-neg'), dfs):
+                    if df.empty:  # sweep stopped before this direction
+                        print('No transfer %s sweep measured (%s).'
+                              % (direction, self.stopReason))
+                        continue
+                    output_name = str(sample + '-' + direction +
+                                      '-transfer.csv')
+                    df.to_csv(output_name, sep='\t', index=False)
+                    self._checkpoint(queue, sample, 'transfer', direction,
+                                     output_name)
+                forward = reverse = False
+
+            if forward:
+                self.loadTSP('transfer-charact.tsp', params)
+                self.runTSP()
+                df = self.readBuffer()
+                self._readStopReason()
+                output_name = str(sample + '-neg-pos-transfer.csv')
+                df.to_csv(output_name, sep='\t', index=False)
+                self._checkpoint(queue, sample, 'transfer', 'neg-pos',
+                                 output_name)
 
             # transfer reverse scan
-            self.loadTSP('transfer-charact-2.tsp')
-            self.runTSP()
-            df = self.readBuffer()
-            output_name = str(sample + '-pos-neg-transfer.csv')
-            df.to_csv(output_name, sep='\t', index=False)
+            if reverse:
+                self.loadTSP('transfer-charact-2.tsp',
+                             tsp.reverse_params(params or {},
+                                                'VgStart', 'VgEnd'))
+                self.runTSP()
+                df = self.readBuffer()
+                self._readStopReason()
+                output_name = str(sample + '-pos-neg-transfer.csv')
+                df.to_csv(output_name, sep='\t', index=False)
+                self._checkpoint(queue, sample, 'transfer', 'pos-neg',
+                                 output_name)
 
             finish_time = time.time()
             print('Transfer curves measured. Elapsed time %.2f mins.'
@@ -240,29 +672,199 @@ class K2636():
         except(AttributeError):
             print('Cannot perform transfer sweep: no keithley connected.')
 
-    def Inverter(self, sample):
-        """K2636 inverter measurement."""
+    def Inverter(self, sample, queue=None, params=None, double=True):
+        """K2636 inverter measurement.
+
+        With double=True both sweep directions are measured by a single
+        script, so the 30 s settle delay is only paid once.
+        """
         try:
             begin_time = time.time()
-            self.loadTSP('inverter.tsp')
-            self.runTSP()
-            df = self.readBufferInverter()
-            output_name = str(sample + '-neg-pos-inverter.csv')
-            df.to_csv(output_name, sep='\t', index=False)
-            
-            # inverter reverse scan
-            self.loadTSP('inverter-reverse.tsp')
-            self.runTSP()
-            df = self.readBufferInverter()
-            output_name = str(sample + '-pos-neg-inverter.csv')
-            df.to_csv(output_name, sep='\t', index=False)            
-            
+            forward = not self._skip(queue, sample, 'inverter', 'neg-pos')
+            reverse = not self._skip(queue, sample, 'inverter', 'pos-neg')
+            if double and forward and reverse:
+                self.loadTSP('inverter-double.tsp', params)
+                self.runTSP()
+                dfs = self._splitSweep(self.readBufferInverter())
+                for direction, df in zip(('neg-pos', 'pos-neg'), dfs):
+                    if df.empty:  # sweep stopped before this direction
+                        print('No inverter %s sweep measured (%s).'
+                              % (direction, self.stopReason))
+                        continue
+                    output_name = str(sample + '-' + direction +
+                                      '-inverter.csv')
+                    df.to_csv(output_name, sep='\t', index=False)
+                    self._checkpoint(queue, sample, 'inverter', direction,
+                                     output_name)
+                forward = reverse = False
+
+            if forward:
+                self.loadTSP('inverter.tsp', params)
+                self.runTSP()
+                df = self.readBufferInverter()
+                output_name = str(sample + '-neg-pos-inverter.csv')
+                df.to_csv(output_name, sep='\t', index=False)
+                self._checkpoint(queue, sample, 'inverter', 'neg-pos',
+                                 output_name)
+
+            # inverter reverse scan (steps V*VinStep for V = VinStart..VinEnd)
+            if reverse:
+                reverse = dict(params or {})
+                for key in ('VinStart', 'VinEnd', 'VinStep'):
+                    reverse.pop(key, None)
+                if params and 'VinStep' in params:
+                    reverse['VinStep'] = -params['VinStep']
+                if params and 'VinEnd' in params:
+                    reverse['VinStart'] = -params['VinEnd']
+                if params and 'VinStart' in params:
+                    reverse['VinEnd'] = -params['VinStart']
+                self.loadTSP('inverter-reverse.tsp', reverse)
+                self.runTSP()
+                df = self.readBufferInverter()
+                output_name = str(sample + '-pos-neg-inverter.csv')
+                df.to_csv(output_name, sep='\t', index=False)
+                self._checkpoint(queue, sample, 'inverter', 'pos-neg',
+                                 output_name)
+
             finish_time = time.time()
             print('Inverter measurement complete. Elapsed time %.2f mins.'
                   % ((finish_time - begin_time) / 60))
 
         except(AttributeError):
             print('Cannot perform output sweep: no keithley connected.')
+
+    def InverterTransient(self, sample, params=None):
+        """K2636 inverter switching speed from a sampled input pulse.
+
+        Saves the waveforms and the output edges, with their rise or fall
+        times and propagation delays, and returns the edges.
+        """
+        import transient
+        try:
+            begin_time = time.time()
+            self.loadTSP('inverter-transient.tsp', params)
+            self.runTSP()
+            df = self.readBufferTransient()
+            output_name = str(sample + '-transient.csv')
+            df.to_csv(output_name, sep='\t', index=False)
+            result = transient.switching(df['Time In [s]'],
+                                         df['Voltage In [V]'],
+                                         df['Time Out [s]'],
+                                         df['Voltage Out [V]'])
+            result.to_csv(str(sample + '-transient-edges.csv'), sep='\t',
+                          index=False)
+            self._record(sample, 'inverter-transient', '', output_name)
+            for edge in result.itertuples(index=False):
+                print('Output %s: transition %.3g s, delay %.3g s.'
+                      % (edge[0], edge[2], edge[4]))
+            finish_time = time.time()
+            print('Inverter transient complete. Elapsed time %.2f s.'
+                  % (finish_time - begin_time))
+            return result
+
+        except(AttributeError):
+            print('Cannot perform inverter transient: no keithley '
+                  'connected.')
+
+    def _streamChunks(self, params=None):
+        """Run stream.tsp and yield each chunk of readings as a DataFrame."""
+        import pandas as pd
+        settings = tsp.get_params(tsp.read_tsp('stream.tsp'))
+        settings.update(params or {})
+        self.loadTSP('stream.tsp', params)
+        # a chunk takes Chunk readings to arrive; allow twice that
+        timeout = self.inst.timeout
+        self.inst.timeout = 1000 * (10 + 2 * settings['Chunk'] *
+                                    (settings['Interval'] +
+                                     settings['Nplc'] / 50))
+        self.runTSP()
+        try:
+            for times, currents in stream.readChunks(self._read):
+                self._publish('points', x=times, y=currents,
+                              new=bool(times) and times[0] == 0)
+                yield pd.DataFrame({'Time [s]': times,
+                                    'Channel Current [A]': currents})
+            self.checkErrors()
+        finally:
+            self.inst.timeout = timeout
+
+    def Stream(self, sample, params=None, callback=None):
+        """K2636 continuous channel current logging at fixed bias.
+
+        stream.tsp alternates between nvbuffer1 and nvbuffer2 and prints
+        each buffer as it fills, so the run length (Duration) is not
+        limited by the buffer size. Chunks are appended to the output file
+        as they arrive; callback, if given, is called with each chunk as a
+        DataFrame. Returns the number of readings taken.
+        """
+        try:
+            begin_time = time.time()
+            output_name = str(sample + '-stream.csv')
+            readings = 0
+            for df in self._streamChunks(params):
+                df.to_csv(output_name, sep='\t', index=False,
+                          mode='a' if readings else 'w', header=not readings)
+                readings += len(df)
+                if callback is not None:
+                    callback(df)
+            self._record(sample, 'stream', '', output_name)
+            finish_time = time.time()
+            print('Stream complete: %d readings. Elapsed time %.2f mins.'
+                  % (readings, (finish_time - begin_time) / 60))
+            return readings
+
+        except(AttributeError):
+            print('Cannot perform stream: no keithley connected.')
+
+    def BiasStress(self, sample, duration, snapshot=None, params=None,
+                   transfer=None, callback=None):
+        """K2636 bias-stress test at fixed Vchan and Vgate.
+
+        The channel current is streamed for duration seconds of stress and
+        appended to <sample>-bias-stress.csv against the time under
+        stress. Every snapshot seconds, and at the start and end, the
+        stress is paused for a transfer sweep (with parameters transfer)
+        saved as <sample>-stress-<seconds>s-*-transfer.csv. Only a
+        downsample.logView of the current is kept in memory; callback, if
+        given, is called with it and the new chunk of readings after each
+        chunk, e.g. to redraw a live plot. Returns the view.
+        """
+        import downsample
+        try:
+            begin_time = time.time()
+            output_name = str(sample + '-bias-stress.csv')
+            view = downsample.logView()
+            settings = tsp.get_params(tsp.read_tsp('stream.tsp'))
+            settings.update(params or {})
+            snapshot = snapshot or duration
+            stressed, readings = 0, 0
+            while True:
+                self.Transfer('%s-stress-%ds' % (sample, stressed),
+                              params=transfer)
+                if stressed >= duration:
+                    break
+                segment = min(snapshot, duration - stressed)
+                last = 0
+                for df in self._streamChunks(dict(params or {},
+                                                  Duration=segment)):
+                    last = df['Time [s]'].iloc[-1]
+                    df['Time [s]'] += stressed
+                    df.to_csv(output_name, sep='\t', index=False,
+                              mode='a' if readings else 'w',
+                              header=not readings)
+                    readings += len(df)
+                    view.add(df['Time [s]'], df['Channel Current [A]'])
+                    if callback is not None:
+                        callback(view, df)
+                stressed += max(segment, last + settings['Interval'])
+            self._record(sample, 'bias-stress', '', output_name)
+            finish_time = time.time()
+            print('Bias stress complete: %d readings. Elapsed time %.2f '
+                  'hours.' % (readings, (finish_time - begin_time) / 3600))
+            return view
+
+        except(AttributeError):
+            print('Cannot perform bias stress: no keithley connected.')
 ########################################################################
 
 
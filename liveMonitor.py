@@ -0,0 +1,192 @@
+"""
+Module for watching running measurements from a web browser.
+
+liveMonitor runs a small HTTP server in a background thread. The driver
+publishes events to it (status changes, finished steps, errors and new
+points), and browsers get them as server-sent events, a few bytes per
+point, instead of a forwarded X display of the GUI:
+
+    python ofetMeasureCLI.py --jobs jobs.yaml --monitor 0.0.0.0:8000
+
+then open http://<computer>:8000/ in a browser. The server has three
+pages: / (a minimal live view), /status (latest status and points as
+JSON) and /events (the event stream).
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import json
+import time
+import queue
+import threading
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE = b'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>K2636 monitor</title>
+<style>body{font-family:sans-serif;margin:1em}canvas{border:1px solid #ccc}
+pre{height:12em;overflow:auto;background:#f6f6f6}</style></head>
+<body><h3 id="status">Connecting...</h3>
+<canvas id="plot" width="640" height="320"></canvas><pre id="log"></pre>
+<script>
+var points = [];
+function draw() {
+  var c = document.getElementById('plot'), g = c.getContext('2d');
+  g.clearRect(0, 0, c.width, c.height);
+  if (points.length < 2) return;
+  var xs = points.map(p => p[0]), ys = points.map(p => p[1]);
+  var x0 = Math.min(...xs), x1 = Math.max(...xs);
+  var y0 = Math.min(...ys), y1 = Math.max(...ys);
+  g.beginPath();
+  points.forEach(function(p, i) {
+    var x = (p[0] - x0) / (x1 - x0 || 1) * (c.width - 10) + 5;
+    var y = c.height - 5 - (p[1] - y0) / (y1 - y0 || 1) * (c.height - 10);
+    i ? g.lineTo(x, y) : g.moveTo(x, y);
+  });
+  g.stroke();
+  g.fillText(y1.toExponential(3), 5, 12);
+  g.fillText(y0.toExponential(3), 5, c.height - 8);
+}
+function log(e) {
+  var l = document.getElementById('log');
+  l.textContent += e.type + ' ' + e.data + '\\n';
+  l.scrollTop = l.scrollHeight;
+}
+fetch('status').then(r => r.json()).then(function(s) {
+  points = s.points; draw();
+  document.getElementById('status').textContent = s.status;
+});
+var source = new EventSource('events');
+source.addEventListener('points', function(e) {
+  var d = JSON.parse(e.data);
+  if (d.new) points = [];
+  d.x.forEach((x, i) => points.push([x, d.y[i]]));
+  points = points.slice(-2000); draw();
+});
+['status', 'done', 'error', 'progress'].forEach(function(name) {
+  source.addEventListener(name, function(e) {
+    log(e);
+    var d = JSON.parse(e.data);
+    if (d.status) document.getElementById('status').textContent = d.status;
+  });
+});
+</script></body></html>
+'''
+
+
+class liveMonitor():
+    """HTTP server publishing measurement events to browsers."""
+
+    def __init__(self, host='127.0.0.1', port=8000, history=2000,
+                 backlog=1000):
+        """Start serving on host:port in a background thread.
+
+        The last history points are kept for new browsers; a browser
+        more than backlog events behind misses the newest ones.
+        """
+        self.state = {'status': 'idle'}
+        self.points = collections.deque(maxlen=history)
+        self.clients = []
+        self.backlog = backlog
+        self.lock = threading.Lock()
+        handler = type('handler', (monitorHandler,), {'monitor': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        print('Live monitor at http://%s:%d/' % self.server.server_address)
+
+    def publish(self, event, **data):
+        """Send an event to every browser and update the latest status.
+
+        'points' events carry lists x and y, and new=True to start a new
+        curve; other events are merged into the status.
+        """
+        data['time'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        message = ('event: %s\ndata: %s\n\n'
+                   % (event, json.dumps(data))).encode()
+        with self.lock:
+            if event == 'points':
+                if data.get('new'):
+                    self.points.clear()
+                self.points.extend(zip(data['x'], data['y']))
+            else:
+                self.state.update(data)
+            for client in self.clients:
+                try:
+                    client.put_nowait(message)
+                except queue.Full:
+                    pass
+
+    def subscribe(self):
+        """Return a queue receiving every event from now on."""
+        client = queue.Queue(self.backlog)
+        with self.lock:
+            self.clients.append(client)
+        return client
+
+    def unsubscribe(self, client):
+        """Stop sending events to a queue."""
+        with self.lock:
+            self.clients.remove(client)
+
+    def status(self):
+        """Return the latest status and points as a dict."""
+        with self.lock:
+            return dict(self.state, points=list(self.points))
+
+    def close(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class monitorHandler(BaseHTTPRequestHandler):
+    """Serves the page, status and event stream of a liveMonitor."""
+
+    monitor = None
+
+    def _send(self, body, kind):
+        """Send a complete reply."""
+        self.send_response(200)
+        self.send_header('Content-Type', kind)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """Answer a request."""
+        path = self.path.split('?')[0]
+        if path == '/':
+            self._send(PAGE, 'text/html; charset=utf-8')
+        elif path == '/status':
+            self._send(json.dumps(self.monitor.status()).encode(),
+                       'application/json')
+        elif path == '/events':
+            self.stream()
+        else:
+            self.send_error(404)
+
+    def stream(self):
+        """Send events as they are published until the browser leaves."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        client = self.monitor.subscribe()
+        try:
+            while True:
+                try:
+                    message = client.get(timeout=15)
+                except queue.Empty:
+                    message = b': keep-alive\n\n'
+                self.wfile.write(message)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.monitor.unsubscribe(client)
+
+    def log_message(self, format, *args):
+        """Keep requests out of the measurement output."""
@@ -0,0 +1,132 @@
+"""
+Module for running measurements in a separate worker process.
+
+The GUI starts run() in its own process so that the serial link and the
+parsing of readback never hold up Qt, and a hung instrument call can't
+freeze the window. Streamed readings are passed back through a
+ringBuffer in shared memory; the pipe carries only small control
+messages: ('done',), ('error', message) or ('skipped', message).
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+
+class ringBuffer():
+    """Fixed-size ring of float64 rows in shared memory.
+
+    One process appends rows and another reads the rows it has not seen
+    yet. The first 8 bytes count every row ever written; the writer
+    updates the count only after the rows are in place. A reader more
+    than capacity rows behind loses the oldest ones.
+    """
+
+    def __init__(self, columns, capacity=65536, name=None):
+        """Create the shared memory, or attach to it by name."""
+        size = 8 + capacity * columns * 8
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.capacity = capacity
+        self.columns = columns
+        self.count = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.rows = np.ndarray((capacity, columns), dtype=np.float64,
+                               buffer=self.shm.buf, offset=8)
+        if self.owner:
+            self.count[0] = 0
+        self.seen = 0
+
+    def append(self, rows):
+        """Write rows (n by columns) to the ring."""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.columns)
+        start = int(self.count[0])
+        if len(rows) > self.capacity:
+            start += len(rows) - self.capacity
+            rows = rows[-self.capacity:]
+        self.rows[(start + np.arange(len(rows))) % self.capacity] = rows
+        self.count[0] = start + len(rows)
+
+    def new(self):
+        """Return a copy of the rows written since the last call."""
+        end = int(self.count[0])
+        begin = max(self.seen, end - self.capacity)
+        self.seen = end
+        return self.rows[np.arange(begin, end) % self.capacity].copy()
+
+    def close(self):
+        """Detach from the shared memory, freeing it if this made it."""
+        self.count = self.rows = None  # views must go before close
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def run(params, conn, ring_name):
+    """Make the measurement described by params, in the worker process."""
+    import k2636  # driver
+    import jobQueue  # checkpointing
+    ring = ringBuffer(2, name=ring_name)
+    keithley = None
+    try:
+        keithley = k2636.K2636()
+        begin_measure = time.time()
+
+        if params['Measurement'] == 'iv-sweep':
+            keithley.IVsweep(params['Sample name'])
+
+        if params['Measurement'] == 'output':
+            keithley.Output(params['Sample name'])
+
+        if params['Measurement'] == 'transfer':
+            keithley.Transfer(params['Sample name'])
+
+        if params['Measurement'] == 'all':
+            # Skip full characterisation of dead or shorted devices
+            screen = keithley.Prescreen(params['Sample name'])
+            if screen is not None and screen['Verdict'] != 'pass':
+                conn.send(('skipped', 'Device failed pre-screen (%s), not '
+                           'measured.' % screen['Verdict']))
+                return
+            # Resume from the last finished step of an interrupted run
+            queue = jobQueue.jobQueue()
+            keithley.IVsweep(params['Sample name'], queue)
+            keithley.Output(params['Sample name'], queue)
+            keithley.Transfer(params['Sample name'], queue)
+            queue.clear(params['Sample name'])
+
+        if params['Measurement'] == 'inverter':
+            keithley.Inverter(params['Sample name'])
+
+        if params['Measurement'] == 'bias-stress':
+            keithley.BiasStress(
+                params['Sample name'], params['Stress time'],
+                params['Snapshot time'],
+                callback=lambda view, df: ring.append(
+                    df[['Time [s]', 'Channel Current [A]']].values))
+
+        conn.send(('done',))
+        finish_measure = time.time()
+        print('-------------------------------------------\nAll measurements complete. Total time % .2f mins.'
+              % ((finish_measure - begin_measure) / 60))
+
+    except ConnectionError:
+        conn.send(('error', 'No measurement made. Please retry.'))
+
+    except k2636.InstrumentError as e:
+        conn.send(('error', 'Keithley reported errors, measurement '
+                   'stopped:\n%s' % e))
+
+    except Exception as e:  # anything else would end the worker silently
+        conn.send(('error', '%s: %s' % (type(e).__name__, e)))
+
+    finally:
+        if keithley is not None:
+            keithley.closeConnection()
+        ring.close()
+        conn.close()
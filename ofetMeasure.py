@@ -2,18 +2,18 @@
 # -*- coding: utf-8 -*-
 
 """
-OFET measurement main program linking gui and measurement thread.
+OFET measurement main program linking gui and measurement process.
 
 Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
 """
 
 import ofetMeasureGUI  # GUI
-import k2636  # driver
+import measureWorker  # measurements in a separate process
+import downsample  # live view of streamed readings
 import sys
-import time
-import pandas as pd
-from PyQt5.QtCore import QThread, pyqtSignal
-from PyQt5.QtWidgets import QApplication
+import multiprocessing
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QInputDialog
 
 
 class GUI(ofetMeasureGUI.mainWindow):
@@ -32,6 +32,7 @@ class GUI(ofetMeasureGUI.mainWindow):
         self.buttonWidget.transferBtn.clicked.connect(self.transferSweep)
         self.buttonWidget.allBtn.clicked.connect(self.allMeasurements)
         self.buttonWidget.inverterBtn.clicked.connect(self.inverter)
+        self.buttonWidget.stressBtn.clicked.connect(self.biasStress)
 
     def ivSweep(self):
         """Perform IV sweep."""
@@ -42,9 +43,10 @@ class GUI(ofetMeasureGUI.mainWindow):
             self.statusbar.showMessage('Performing IV Sweep...')
             self.buttonWidget.hideButtons()
             self.params['Measurement'] = 'iv-sweep'
-            self.measureThread = measureThread(self.params)
-            self.measureThread.finishedSig.connect(self.done)
-            self.measureThread.start()
+            self.measurement = measureProcess(self.params)
+            self.measurement.finishedSig.connect(self.done)
+            self.measurement.errorSig.connect(self.error)
+            self.measurement.start()
         except AttributeError or KeyError:
             self.popupWarning.showWindow('No sample name given!')
 
@@ -57,9 +59,10 @@ class GUI(ofetMeasureGUI.mainWindow):
             self.statusbar.showMessage('Performing Output Sweep...')
             self.buttonWidget.hideButtons()
             self.params['Measurement'] = 'output'
-            self.measureThread = measureThread(self.params)
-            self.measureThread.finishedSig.connect(self.done)
-            self.measureThread.start()
+            self.measurement = measureProcess(self.params)
+            self.measurement.finishedSig.connect(self.done)
+            self.measurement.errorSig.connect(self.error)
+            self.measurement.start()
         except AttributeError:
             self.popupWarning.showWindow('No sample name given!')
 
@@ -72,10 +75,10 @@ class GUI(ofetMeasureGUI.mainWindow):
             self.statusbar.showMessage('Performing Transfer Sweep...')
             self.buttonWidget.hideButtons()
             self.params['Measurement'] = 'transfer'
-            self.measureThread = measureThread(self.params)
-            self.measureThread.finishedSig.connect(self.done)
-            self.measureThread.errorSig.connect(self.error)
-            self.measureThread.start()
+            self.measurement = measureProcess(self.params)
+            self.measurement.finishedSig.connect(self.done)
+            self.measurement.errorSig.connect(self.error)
+            self.measurement.start()
         except AttributeError:
             self.popupWarning.showWindow('No sample name given!')
 
@@ -88,10 +91,11 @@ class GUI(ofetMeasureGUI.mainWindow):
             self.statusbar.showMessage('Performing all...')
             self.buttonWidget.hideButtons()
             self.params['Measurement'] = 'all'
-            self.measureThread = measureThread(self.params)
-            self.measureThread.finishedSig.connect(self.done)
-            self.measureThread.errorSig.connect(self.error)
-            self.measureThread.start()
+            self.measurement = measureProcess(self.params)
+            self.measurement.finishedSig.connect(self.done)
+            self.measurement.errorSig.connect(self.error)
+            self.measurement.skippedSig.connect(self.skipped)
+            self.measurement.start()
         except AttributeError:
             self.popupWarning.showWindow('No sample name given!')
 
@@ -104,10 +108,40 @@ class GUI(ofetMeasureGUI.mainWindow):
             self.statusbar.showMessage('Performing inverter measurement...')
             self.buttonWidget.hideButtons()
             self.params['Measurement'] = 'inverter'
-            self.measureThread = measureThread(self.params)
-            self.measureThread.finishedSig.connect(self.done)
-            self.measureThread.errorSig.connect(self.error)
-            self.measureThread.start()
+            self.measurement = measureProcess(self.params)
+            self.measurement.finishedSig.connect(self.done)
+            self.measurement.errorSig.connect(self.error)
+            self.measurement.start()
+        except AttributeError:
+            self.popupWarning.showWindow('No sample name given!')
+
+    def biasStress(self, event):
+        """Perform bias-stress measurement with live plotting."""
+        try:
+            if self.buttonWidget.SampleName is None:
+                raise AttributeError
+            hours, ok = QInputDialog.getDouble(self, 'Bias Stress',
+                                               'Stress time [hours]:', 1,
+                                               0.01, 1000, 2)
+            if not ok:
+                return
+            every, ok = QInputDialog.getDouble(self, 'Bias Stress',
+                                               'Transfer curve every '
+                                               '[hours]:', hours, 0.01,
+                                               1000, 2)
+            if not ok:
+                return
+            self.params['Sample name'] = self.buttonWidget.SampleName
+            self.params['Stress time'] = hours * 3600
+            self.params['Snapshot time'] = every * 3600
+            self.statusbar.showMessage('Performing bias stress...')
+            self.buttonWidget.hideButtons()
+            self.params['Measurement'] = 'bias-stress'
+            self.measurement = measureProcess(self.params)
+            self.measurement.finishedSig.connect(self.done)
+            self.measurement.errorSig.connect(self.error)
+            self.measurement.stressSig.connect(self.mainWidget.drawStress)
+            self.measurement.start()
         except AttributeError:
             self.popupWarning.showWindow('No sample name given!')
 
@@ -117,6 +151,12 @@ class GUI(ofetMeasureGUI.mainWindow):
         self.dislpayMeasurement()
         self.buttonWidget.showButtons()
 
+    def skipped(self, message):
+        """Report a device that was not measured."""
+        self.popupWarning.showWindow(str(message))
+        self.statusbar.showMessage(str(message))
+        self.buttonWidget.showButtons()
+
     def error(self, message):
         """Raise error warning."""
         self.popupWarning.showWindow(str(message))
@@ -125,82 +165,110 @@ class GUI(ofetMeasureGUI.mainWindow):
 
     def dislpayMeasurement(self):
         """Display the data on screen."""
+        sample = str(self.params['Sample name'])
+        measurement = self.params['Measurement']
         try:
             # IV sweep display
-            if self.params['Measurement'] == 'iv-sweep':
-                df = pd.read_csv(str(self.params['Sample name'] + '-' +
-                                 self.params['Measurement'] + '.csv'), '\t')
+            if measurement == 'iv-sweep':
+                df = ofetMeasureGUI.readData(sample + '-iv-sweep.csv')
                 self.mainWidget.drawIV(df)
             # OUTPUT sweep display
-            elif self.params['Measurement'] == 'output':
-                df = pd.read_csv(str(self.params['Sample name'] + '-' +
-                                 self.params['Measurement'] + '.csv'), '\t')
+            elif measurement == 'output':
+                df = ofetMeasureGUI.readData(sample + '-output.csv')
                 self.mainWidget.drawOutput(df)
             # TRANSFER sweep display
-            elif self.params['Measurement'] == 'transfer':
-                df = pd.read_csv(str(self.params['Sample name'] + '-neg-pos-' +
-                                 self.params['Measurement'] + '.csv'), '\t')
+            elif measurement == 'transfer':
+                df = ofetMeasureGUI.readData(sample + '-neg-pos-transfer.csv')
                 self.mainWidget.drawTransfer(df)
             # ALL sweeps display
-            elif self.params['Measurement'] == 'all':
-                self.mainWidget.drawAll(str(self.params['Sample name']))
+            elif measurement == 'all':
+                self.mainWidget.drawAll(sample)
             # INVERTER sweep display
-            elif self.params['Measurement'] == 'inverter':
-                df = pd.read_csv(str(self.params['Sample name'] + '-' +
-                                 self.params['Measurement'] + '.csv'), '\t')
+            elif measurement == 'inverter':
+                df = ofetMeasureGUI.readData(sample + '-inverter.csv')
                 self.mainWidget.drawInverter(df)
 
         except FileNotFoundError:
             self.popupWarning.showWindow('Could not find data!')
 
 
-class measureThread(QThread):
-    """Thread for running measurements."""
+class measureProcess(QObject):
+    """Measurement run in a worker process, reporting back to the GUI.
+
+    Readings streamed by the worker arrive through a shared memory ring
+    buffer and control messages through a pipe; both are polled from a
+    timer in the GUI thread, so a slow or hung instrument never blocks
+    the window.
+    """
 
     finishedSig = pyqtSignal()
     errorSig = pyqtSignal(str)
+    skippedSig = pyqtSignal(str)
+    stressSig = pyqtSignal(object)
 
-    def __init__(self, params):
-        """Initialise threads."""
-        QThread.__init__(self)
-        self.params = params
-
-    def __del__(self):
-        """When thread is deconstructed wait for porcesses to complete."""
-        self.wait()
-
-    def run(self):
-        """Logic to be run in background thread."""
-        try:
-            keithley = k2636.K2636()
-            begin_measure = time.time()
-
-            if self.params['Measurement'] == 'iv-sweep':
-                keithley.IVsweep(self.params['Sample name'])
-
-            if self.params['Measurement'] == 'output':
-                keithley.Output(self.params['Sample name'])
-
-            if self.params['Measurement'] == 'transfer':
-                keithley.Transfer(self.params['Sample name'])
+    def __init__(self, params, interval=200):
+        """Set up the worker process, ring buffer and pipe."""
+        super().__init__()
+        self.params = dict(params)
+        self.interval = interval  # ms between polls
+        self.ring = measureWorker.ringBuffer(2)
+        self.view = downsample.logView()
+        context = multiprocessing.get_context('spawn')  # no fork under Qt
+        self.conn, child = context.Pipe(duplex=False)
+        self.process = context.Process(target=measureWorker.run,
+                                       args=(self.params, child,
+                                             self.ring.name),
+                                       daemon=True)
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.poll)
 
-            if self.params['Measurement'] == 'all':
-                keithley.IVsweep(self.params['Sample name'])
-                keithley.Output(self.params['Sample name'])
-                keithley.Transfer(self.params['Sample name'])
+    def start(self):
+        """Start the measurement."""
+        self.process.start()
+        self.timer.start(self.interval)
 
-            if self.params['Measurement'] == 'inverter':
-                keithley.Inverter(self.params['Sample name'])
+    def poll(self):
+        """Pass new readings and messages from the worker to the GUI."""
+        rows = self.ring.new()
+        if len(rows):
+            self.view.add(rows[:, 0], rows[:, 1])
+            self.stressSig.emit(self.view.frame())
+        alive = self.process.is_alive()
+        # A worker that has just ended may still have a message in the pipe
+        if self.receive():
+            return
+        if not alive:
+            self.stop()
+            self.errorSig.emit('Measurement process stopped unexpectedly.')
 
-            keithley.closeConnection()
+    def receive(self):
+        """Pass on the final message of the worker, if it has arrived."""
+        try:
+            if not self.conn.poll():
+                return False
+            message = self.conn.recv()
+        except (EOFError, OSError):
+            return False
+        self.stop()
+        if message[0] == 'done':
             self.finishedSig.emit()
-            finish_measure = time.time()
-            print('-------------------------------------------\nAll measurements complete. Total time % .2f mins.'
-                  % ((finish_measure - begin_measure) / 60))
+        elif message[0] == 'skipped':
+            self.skippedSig.emit(message[1])
+        else:
+            self.errorSig.emit(message[1])
+        return True
+
+    def stop(self):
+        """Stop polling and free memory; the worker is reaped later."""
+        self.timer.stop()
+        self.ring.close()
+        QTimer.singleShot(1000, self.reap)
 
-        except ConnectionError:
-            self.errorSig.emit('No measurement made. Please retry.')
-            self.quit()
+    def reap(self):
+        """End the worker if it is still running after its last message."""
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(0.5)
 
 
 if __name__ == '__main__':
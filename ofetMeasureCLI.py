@@ -7,45 +7,196 @@
 """
 
 import k2636
+import jobQueue
+import sampleInfo
+import autotune
+import sys
+import json
+import contextlib
 import time
 import click
-import pandas as pd
-import matplotlib.pyplot as plt
+
+monitor = None  # liveMonitor publishing progress, if started
 
 @click.command()
-@click.option('--sample', prompt='Please input sample name:', help='Sample name.')
-@click.option('--graphic', default=True, help='TRUE or FALSE display measurement in graphic format.')
-def main(sample, graphic=True):
+@click.option('--sample', default=None, help='Sample name.')
+@click.option('--jobs', default=None, type=click.Path(exists=True), help='YAML or CSV job file to run unattended instead of a single sample.')
+@click.option('--graphic', default=None, type=bool, help='TRUE or FALSE display measurement in graphic format.')
+@click.option('--queue', default='measurement-queue.json', help='File recording finished steps, used to resume interrupted runs.')
+@click.option('--restart', is_flag=True, help='Ignore finished steps and measure everything again.')
+@click.option('--prescreen/--no-prescreen', default=True, help='Skip devices that fail a fast open/short/leakage check.')
+@click.option('--profile', default=None, type=click.Path(exists=True), help='Speed/noise settings profile saved by autotune.py.')
+@click.option('--address', default=jobQueue.DEFAULT_ADDRESS, help='Instrument address: serial port, IP address for a raw socket, or VISA GPIB/VXI-11 resource.')
+@click.option('--monitor', 'monitor_at', default=None, help='HOST:PORT to serve a live web monitor on, e.g. 0.0.0.0:8000.')
+@click.option('--length', default=None, type=float, help='Channel length in um, saved with the measurements.')
+@click.option('--width', default=None, type=float, help='Channel width in um, saved with the measurements.')
+@click.option('--substrate', default=None, help='Substrate the device is on, saved with the measurements.')
+@click.option('--row', default=None, type=int, help='Row of the device on the substrate.')
+@click.option('--column', default=None, type=int, help='Column of the device on the substrate.')
+def main(sample=None, jobs=None, graphic=None, queue='measurement-queue.json', restart=False, prescreen=True, profile=None, address=jobQueue.DEFAULT_ADDRESS, monitor_at=None, length=None, width=None, substrate=None, row=None, column=None):
     '''Simple program which makes all OFET measurements from CLI.'''
+    global monitor
+    if monitor_at is not None:
+        import liveMonitor
+        host, _, port = monitor_at.rpartition(':')
+        monitor = liveMonitor.liveMonitor(host or '127.0.0.1', int(port))
+    if jobs is not None:
+        batch(jobs, queue, restart, graphic, prescreen, profile)
+        return
+    if profile is not None:
+        profile = autotune.loadProfile(profile)
+    if sample is None and None not in (substrate, row, column):
+        sample = sampleInfo.deviceName(substrate, row, column)
+    if sample is None:
+        sample = click.prompt('Please input sample name:')
     try:
         print(sample)
         # Set up
-        keithley = k2636.K2636()
+        keithley = k2636.K2636(address=address)
+        keithley.monitor = monitor
+        keithley.info = sampleInfo.details(length, width, substrate, row,
+                                           column)
         begin_measure = time.time()
+        steps = jobQueue.jobQueue(queue)
+        if restart:
+            steps.clear(sample)
+        if prescreen:
+            screen = keithley.Prescreen(sample)
+            if screen is not None and screen['Verdict'] != 'pass':
+                keithley.closeConnection()
+                print('Device failed pre-screen (%s), not measured.'
+                      % screen['Verdict'])
+                return
         # Measurements
-        keithley.IVsweep(sample)
-        keithley.Output(sample)
-        keithley.Transfer(sample)
+        keithley.IVsweep(sample, steps,
+                         autotune.applyProfile(profile, 'iv-sweep'))
+        keithley.Output(sample, steps,
+                        autotune.applyProfile(profile, 'output'))
+        keithley.Transfer(sample, steps,
+                          autotune.applyProfile(profile, 'transfer'))
+        steps.clear(sample)
         # Finish
         keithley.closeConnection()
         finish_measure = time.time()
         print('-------------------------------------------\nAll measurements complete. Total time % .2f mins.'
               % ((finish_measure - begin_measure) / 60))
-        if graphic == True:
+        if graphic is not False:
             plot(sample)
 
     except ConnectionError:
         print('MEASUREMENT ERROR: Measurement could not be made due to connection issues.')
+    except k2636.InstrumentError as e:
+        keithley.closeConnection()
+        print('MEASUREMENT ERROR: Keithley reported errors, measurement stopped: %s' % e)
+
+def progress(event, **info):
+    '''Print a machine-readable JSON progress line on stdout.'''
+    info['event'] = event
+    info['time'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    sys.__stdout__.write(json.dumps(info) + '\n')
+    sys.__stdout__.flush()
+    if monitor is not None:
+        monitor.publish('progress', **info)
+
+def batch(jobfile, queue='measurement-queue.json', restart=False, graphic=None, prescreen=True, profile=None):
+    '''Run every job in a job file without any prompts.'''
+    try:
+        jobs = jobQueue.readJobFile(jobfile)
+        profiles = {}  # file name: settings
+        for job in jobs:
+            fname = job.get('profile', profile)
+            if fname is not None and fname not in profiles:
+                profiles[fname] = autotune.loadProfile(fname)
+    except (ValueError, KeyError, ImportError, OSError) as e:
+        progress('error', message='Bad job file: %s' % e)
+        sys.exit(1)
+    steps = jobQueue.jobQueue(queue)
+    if restart:
+        steps.clear()
+    progress('batch-start', jobs=len(jobs), jobfile=str(jobfile))
+    keithley, address, failures = None, None, 0
+    begin_measure = time.time()
+
+    # driver messages go to stderr so stdout stays machine-readable
+    with contextlib.redirect_stdout(sys.stderr):
+        for n, job in enumerate(jobs, 1):
+            sample = job['sample']
+            try:
+                if job['address'] != address:
+                    if keithley is not None:
+                        keithley.closeConnection()
+                    keithley = k2636.K2636(address=job['address'])
+                    keithley.monitor = monitor
+                    address = job['address']
+                keithley.info = sampleInfo.details(
+                    job.get('length'), job.get('width'),
+                    job.get('substrate'), job.get('row'), job.get('column'))
+                if jobQueue.prescreened(job, prescreen):
+                    screen = keithley.Prescreen(sample,
+                                                job['params'].get('prescreen'))
+                    if screen is not None and screen['Verdict'] != 'pass':
+                        progress('skipped', job=n, of=len(jobs),
+                                 sample=sample, **screen)
+                        continue
+                methods = {'iv-sweep': keithley.IVsweep,
+                           'output': keithley.Output,
+                           'transfer': keithley.Transfer,
+                           'inverter': keithley.Inverter,
+                           'iv-dual': lambda s, q, p: keithley.IVsweepDual(
+                               s, job['sampleB'], q, p)}
+                for measurement in job['measurements']:
+                    progress('start', job=n, of=len(jobs), sample=sample,
+                             measurement=measurement)
+                    params = autotune.applyProfile(
+                        profiles.get(job.get('profile', profile)),
+                        measurement, job['params'].get(measurement))
+                    finished = keithley.finished
+                    methods[measurement](sample, steps, params)
+                    if keithley.finished == finished:  # caught and printed
+                        failures += 1
+                        progress('error', job=n, of=len(jobs), sample=sample,
+                                 measurement=measurement,
+                                 message='Nothing measured.')
+                        continue
+                    progress('done', job=n, of=len(jobs), sample=sample,
+                             measurement=measurement,
+                             stopped=keithley.stopReason)
+                if job.get('plot', graphic):
+                    plot(sample, show=False)
+            except Exception as e:  # keep going with the rest of the batch
+                failures += 1
+                progress('error', job=n, of=len(jobs), sample=sample,
+                         message='%s: %s' % (type(e).__name__, e))
+                if isinstance(e, ConnectionError):
+                    if keithley is not None:
+                        try:
+                            keithley.closeConnection()
+                        except Exception:
+                            pass
+                    keithley, address = None, None
+
+    if keithley is not None:
+        keithley.closeConnection()
+    if failures == 0:
+        steps.clear()
+    progress('batch-finish', jobs=len(jobs), failed=failures,
+             minutes=round((time.time() - begin_measure) / 60, 2))
+    if failures:
+        sys.exit(1)
 
-def plot(sample):
-    '''Creates plot of measurements'''
+def plot(sample, show=True):
+    '''Creates plot of measurements, saving it to file when not shown'''
+    if not show:  # headless, e.g. from cron
+        import report
+        report.renderSample(sample)
+        return
+    import dataCache
+    import matplotlib.pyplot as plt
     try:
-        df1 = pd.read_csv(str(sample + '-iv-sweep.csv'), '\t')
-        df2 = pd.read_csv(str(sample + '-output.csv'), '\t')
-        df3 = pd.read_csv(
-            str(sample + '-neg-pos-transfer.csv'), '\t')
-        df4 = pd.read_csv(
-            str(sample + '-pos-neg-transfer.csv'), '\t')
+        df1 = dataCache.read(sample + '-iv-sweep.csv')
+        df2 = dataCache.read(sample + '-output.csv')
+        df3 = dataCache.read(sample + '-neg-pos-transfer.csv')
+        df4 = dataCache.read(sample + '-pos-neg-transfer.csv')
     except FileNotFoundError:
         # If it can't find some data, dont worry :)
         pass
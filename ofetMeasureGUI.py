@@ -5,15 +5,18 @@ Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
 """
 
 import k2636  # Driver for keithley 2636
+import dataCache  # parsed and plot-ready data cached on disk
+import os
 import sys
 import fnmatch
-import pandas as pd
-from PyQt5.QtCore import pyqtSignal, Qt
+from functools import partial
+from PyQt5.QtCore import pyqtSignal, Qt, QObject, QRunnable, QThreadPool
 from PyQt5.QtWidgets import (QMainWindow, QDockWidget, QWidget, QDesktopWidget,
                              QApplication, QGridLayout, QPushButton, QLabel,
                              QDoubleSpinBox, QAction, qApp, QSizePolicy,
                              QTextEdit, QFileDialog, QInputDialog, QLineEdit,
-                             QMessageBox)
+                             QMessageBox, QListWidget, QListWidgetItem,
+                             QComboBox)
 
 import matplotlib
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
@@ -23,6 +26,18 @@ from matplotlib.figure import Figure
 
 matplotlib.use("Qt5Agg")
 
+# Files making up an ALL measurement of one sample
+ALL_FILES = ['-iv-sweep.csv', '-output.csv', '-neg-pos-transfer.csv',
+             '-pos-neg-transfer.csv']
+# Names like W01-R03-C12 save the device position on its substrate
+SAMPLE_PROMPT = ('Enter sample name\n(substrate-Rrow-Ccolumn, e.g. W01-R03-C12, '
+                 'for wafer maps):')
+
+
+def readData(fname):
+    """Read a tab-separated data file, parsed once per file content."""
+    return dataCache.read(fname)
+
 
 class mainWindow(QMainWindow):
     """Create mainwindow of GUI."""
@@ -38,11 +53,15 @@ class mainWindow(QMainWindow):
         self.mainWidget = mplWidget()
         self.setCentralWidget(self.mainWidget)
 
+        # Worker pool for loading data files off the GUI thread
+        self.loaderPool = QThreadPool()
+
         # Add other window widgets
         self.keithleySettingsWindow = keithleySettingsWindow()
         self.keithleyConnectionWindow = keithleyConnectionWindow()
         self.keithleyErrorWindow = keithleyErrorWindow()
         self.popupWarning = warningWindow()
+        self.compareWindow = compareWindow()
 
         # Dock setup
         # Keithley dock widget
@@ -73,6 +92,12 @@ class mainWindow(QMainWindow):
         loadALLAction.setStatusTip(
             'Load iv, output and transfer data to be displayed')
         loadALLAction.triggered.connect(self.showFileOpenALL)
+        # Compare many devices
+        compareAction = QAction('&Compare devices', self)
+        compareAction.setShortcut('Ctrl+M')
+        compareAction.setStatusTip(
+            'Overlay transfer or output curves from many devices')
+        compareAction.triggered.connect(self.compareWindow.show)
         # Clear data
         clearAction = QAction('Clear', self)
         clearAction.setShortcut('Ctrl+C')
@@ -96,6 +121,7 @@ class mainWindow(QMainWindow):
         fileMenu = menubar.addMenu('&File')
         fileMenu.addAction(loadAction)
         fileMenu.addAction(loadALLAction)
+        fileMenu.addAction(compareAction)
         fileMenu.addAction(clearAction)
         fileMenu.addSeparator()
         fileMenu.addAction(exitAction)
@@ -140,53 +166,126 @@ class mainWindow(QMainWindow):
     def showFileOpen(self):
             """Pop up for file selection."""
             filt1 = '*.csv'
+            fnames = QFileDialog.getOpenFileNames(self, 'Open file',
+                                                  filter=filt1)
+            if fnames[0]:
+                self.loadFiles(fnames[0], self.drawLoaded)
+
+    def showFileOpenALL(self):
+            """Pop up for file selection for ALL measurements."""
+            filt1 = '*.csv'
             fname = QFileDialog.getOpenFileName(self, 'Open file', filter=filt1)
             if fname[0]:
+                fileN = fname[0]
+                if fnmatch.fnmatch(fname[0], '*iv-sweep.csv'):
+                    fileN = fileN[:-13]
+                elif fnmatch.fnmatch(fname[0], '*output.csv'):
+                    fileN = fileN[:-11]
+                elif fnmatch.fnmatch(fname[0], '*transfer.csv'):
+                    fileN = fileN[:-21]
+                elif fnmatch.fnmatch(fname[0], '*gate-leakage.csv'):
+                    fileN = fileN[:-17]
+                elif fnmatch.fnmatch(fname[0], '*inverter.csv'):
+                    fileN = fileN[:-13]
+                fnames = [fileN + end for end in ALL_FILES
+                          if os.path.isfile(fileN + end)]
+                if fnames:
+                    self.loadFiles(fnames, self.drawLoadedAll)
+                else:
+                    self.popupWarning.showWindow('Unsupported file.')
+
+    def loadFiles(self, fnames, done):
+            """Read files on the worker pool, then pass them all to done."""
+            batch = {'total': len(fnames), 'count': 0, 'results': {},
+                     'order': list(fnames), 'done': done}
+            self.statusbar.showMessage('Loading files... 0/%d' % len(fnames))
+            for fname in fnames:
+                worker = fileLoader(fname, self.mainWidget.width())
+                worker.signals.loaded.connect(partial(self.fileLoaded, batch))
+                worker.signals.failed.connect(partial(self.fileFailed, batch))
+                self.loaderPool.start(worker)
+
+    def fileLoaded(self, batch, fname, df):
+            """Store a loaded file and finish the batch once all are in."""
+            batch['results'][fname] = df
+            self.fileCounted(batch)
+
+    def fileFailed(self, batch, fname, message):
+            """Report a file that could not be read."""
+            self.popupWarning.showWindow('Could not read %s' %
+                                         os.path.basename(fname))
+            self.fileCounted(batch)
+
+    def fileCounted(self, batch):
+            """Update loading progress."""
+            batch['count'] += 1
+            self.statusbar.showMessage('Loading files... %d/%d' %
+                                       (batch['count'], batch['total']))
+            if batch['count'] == batch['total']:
+                results = [(f, batch['results'][f]) for f in batch['order']
+                           if f in batch['results']]
+                batch['done'](results)
+                self.statusbar.showMessage('Loaded %d file(s).' % len(results))
+
+    def drawLoaded(self, results):
+            """Draw each loaded file according to its measurement type."""
+            for fname, df in results:
                 try:
-                    df = pd.read_csv(fname[0], '\t')
-                    if fnmatch.fnmatch(fname[0], '*iv-sweep.csv'):
+                    if fnmatch.fnmatch(fname, '*iv-sweep.csv'):
                         self.mainWidget.drawIV(df)
-                    elif fnmatch.fnmatch(fname[0], '*output.csv'):
+                    elif fnmatch.fnmatch(fname, '*output.csv'):
                         self.mainWidget.drawOutput(df)
-                    elif fnmatch.fnmatch(fname[0], '*transfer.csv'):
+                    elif fnmatch.fnmatch(fname, '*transfer.csv'):
                         self.mainWidget.drawTransfer(df)
-                    elif fnmatch.fnmatch(fname[0], '*gate-leakage.csv'):
+                    elif fnmatch.fnmatch(fname, '*gate-leakage.csv'):
                         self.mainWidget.drawLeakage(df)
-                    elif fnmatch.fnmatch(fname[0], '*inverter.csv'):
+                    elif fnmatch.fnmatch(fname, '*inverter.csv'):
                         self.mainWidget.drawInverter(df)
                     else:
-                        raise FileNotFoundError
-                except KeyError or FileNotFoundError:
-                    self.popupWarning.showWindow('Unsupported file.')
-
-    def showFileOpenALL(self):
-            """Pop up for file selection for ALL measurements."""
-            filt1 = '*.csv'
-            fname = QFileDialog.getOpenFileName(self, 'Open file', filter=filt1)
-            if fname[0]:
-                try:
-                    fileN = fname[0]
-                    if fnmatch.fnmatch(fname[0], '*iv-sweep.csv'):
-                        fileN = fileN[:-13]
-                    elif fnmatch.fnmatch(fname[0], '*output.csv'):
-                        fileN = fileN[:-11]
-                    elif fnmatch.fnmatch(fname[0], '*transfer.csv'):
-                        fileN = fileN[:-21]
-                    elif fnmatch.fnmatch(fname[0], '*gate-leakage.csv'):
-                        fileN = fileN[:-17]
-                    elif fnmatch.fnmatch(fname[0], '*inverter.csv'):
-                        fileN = fileN[:-13]
-                    self.mainWidget.drawAll(fileN)
-
-                except KeyError or FileNotFoundError:
+                        raise KeyError
+                except KeyError:
                     self.popupWarning.showWindow('Unsupported file.')
 
+    def drawLoadedAll(self, results):
+            """Draw the loaded files of one sample on the 2x2 display."""
+            data = {}
+            for fname, df in results:
+                for end in ALL_FILES:
+                    if fname.endswith(end):
+                        data[end] = df
+            self.mainWidget.drawAllData(*[data.get(end) for end in ALL_FILES])
 
     def updateStatusbar(slf, s):
         """Put text in status bar."""
         self.statusbar.showMessage(s)
 
 
+class loaderSignals(QObject):
+        """Signals emitted by a file loading worker."""
+
+        loaded = pyqtSignal(str, object)
+        failed = pyqtSignal(str, str)
+
+
+class fileLoader(QRunnable):
+        """Worker reading and downsampling a data file off the GUI thread."""
+
+        def __init__(self, fname, bins):
+            """Store file name and number of points across the plot."""
+            super().__init__()
+            self.fname = fname
+            self.bins = bins
+            self.signals = loaderSignals()
+
+        def run(self):
+            """Read the file and emit it reduced to screen resolution."""
+            try:
+                df = dataCache.decimated(self.fname, self.bins)
+                self.signals.loaded.emit(self.fname, df)
+            except (OSError, ValueError) as e:
+                self.signals.failed.emit(self.fname, str(e))
+
+
 class keithleyButtonWidget(QWidget):
         """Defines class with buttons controlling keithley."""
 
@@ -226,18 +325,22 @@ class keithleyButtonWidget(QWidget):
             self.inverterBtn.clicked.connect(self.inverterPopup)
             self.inverterBtn.clicked.connect(self.showSampleNameInput)
 
+            self.stressBtn = QPushButton('Bias Stress')
+            grid.addWidget(self.stressBtn, 2, 2)
+            self.stressBtn.clicked.connect(self.showSampleNameInput)
+
         def showSampleNameInput(self):
             """Popup for sample name input."""
             samNam = QInputDialog()
             try:
                 text, ok = samNam.getText(self, 'Sample Name',
-                                          'Enter sample name:',
+                                          SAMPLE_PROMPT,
                                           QLineEdit.Normal,
                                           str(self.SampleName))
 
             except AttributeError:
                 text, ok = samNam.getText(self, 'Sample Name',
-                                          'Enter sample name:')
+                                          SAMPLE_PROMPT)
             if ok:
                 if text != '':  # to catch empty input
                     self.SampleName = str(text)
@@ -259,6 +362,7 @@ class keithleyButtonWidget(QWidget):
             self.transferBtn.setEnabled(False)
             self.allBtn.setEnabled(False)
             self.inverterBtn.setEnabled(False)
+            self.stressBtn.setEnabled(False)
 
         def showButtons(self):
             """Show control buttons."""
@@ -267,6 +371,7 @@ class keithleyButtonWidget(QWidget):
             self.transferBtn.setEnabled(True)
             self.allBtn.setEnabled(True)
             self.inverterBtn.setEnabled(True)
+            self.stressBtn.setEnabled(True)
 
 
 class mplWidget(FigureCanvas):
@@ -334,56 +439,51 @@ class mplWidget(FigureCanvas):
 
         def drawAll(self, sample):
             """Take all sweeps and draw them."""
-            try:
-                df1 = pd.read_csv(str(sample + '-iv-sweep.csv'), '\t')
-                df2 = pd.read_csv(str(sample + '-output.csv'), '\t')
-                df3 = pd.read_csv(
-                    str(sample + '-neg-pos-transfer.csv'), '\t')
-                df4 = pd.read_csv(
-                    str(sample + '-pos-neg-transfer.csv'), '\t')
-            except FileNotFoundError:
-                # If it can't find some data, dont worry :)
-                pass
-
+            dfs = []
+            for end in ALL_FILES:
+                try:
+                    dfs.append(readData(sample + end))
+                except FileNotFoundError:
+                    # If it can't find some data, dont worry :)
+                    dfs.append(None)
+            self.drawAllData(*dfs)
+
+        def drawAllData(self, df1, df2, df3, df4):
+            """Draw iv, output and both transfer sweeps, skipping missing."""
             self.fig.clear()
             self.ax1 = self.fig.add_subplot(221)
             self.ax2 = self.fig.add_subplot(222)
             self.ax3 = self.fig.add_subplot(223)
             self.ax4 = self.fig.add_subplot(224)
 
-            try:
+            if df1 is not None:
                 self.ax1.plot(df1['Channel Voltage [V]'],
                               df1['Channel Current [A]'] / 1e-6, '.')
                 self.ax1.set_title('I-V sweep')
                 self.ax1.set_xlabel('Channel Voltage [V]')
                 self.ax1.set_ylabel('Channel Current [$\mu$A]')
 
+            if df2 is not None:
                 self.ax2.plot(df2['Channel Voltage [V]'],
                               df2['Channel Current [A]'] / 1e-6, '.')
                 self.ax2.set_title('Output curves')
                 self.ax2.set_xlabel('Channel Voltage [V]')
                 self.ax2.set_ylabel('Channel Current [$\mu$A]')
 
-                self.ax3.semilogy(df3['Gate Voltage [V]'],
-                              abs(df3['Channel Current [A]']), '.')
-                self.ax3.set_title('Transfer Curves')
-                self.ax3.set_xlabel('Gate Voltage [V]')
-                self.ax3.set_ylabel('Channel Current [A]')
-
-                self.ax3.semilogy(df4['Gate Voltage [V]'],
-                              abs(df4['Channel Current [A]']), '.')
-                self.ax3.set_title('Transfer Curves')
-                self.ax3.set_xlabel('Gate Voltage [V]')
-                self.ax3.set_ylabel('Channel Current [A]')
+            for df in (df3, df4):
+                if df is not None:
+                    self.ax3.semilogy(df['Gate Voltage [V]'],
+                                      abs(df['Channel Current [A]']), '.')
+                    self.ax3.set_title('Transfer Curves')
+                    self.ax3.set_xlabel('Gate Voltage [V]')
+                    self.ax3.set_ylabel('Channel Current [A]')
 
+            if df3 is not None:
                 self.ax4.plot(df3['Gate Voltage [V]'],
                               df3['Gate Leakage [A]'] / 1e-9, '.')
                 self.ax4.set_title('Gate leakage current')
                 self.ax4.set_xlabel('Gate Voltage [V]')
                 self.ax4.set_ylabel('Gate Leakage [nA]')
-            except UnboundLocalError:
-                pass  # if data isnt there, it cant be plotted
-            
 
             self.fig.tight_layout()
             FigureCanvas.draw(self)
@@ -399,12 +499,144 @@ class mplWidget(FigureCanvas):
             self.fig.tight_layout()
             FigureCanvas.draw(self)
 
+        def drawStress(self, df):
+            """Draw a log-time view of a running bias-stress measurement."""
+            self.fig.clear()
+            self.ax1 = self.fig.add_subplot(111)
+            self.ax1.fill_between(df['Time [s]'], abs(df['Min']),
+                                  abs(df['Max']), alpha=0.3)
+            self.ax1.loglog(df['Time [s]'], abs(df['Channel Current [A]']),
+                            '.')
+            self.ax1.set_title('Bias stress')
+            self.ax1.set_xlabel('Stress Time [s]')
+            self.ax1.set_ylabel('Channel Current [A]')
+            self.fig.tight_layout()
+            FigureCanvas.draw(self)
+
+        def drawCompare(self, curves, kind):
+            """Overlay (label, df) curves of one kind from many devices."""
+            self.fig.clear()
+            self.ax1 = self.fig.add_subplot(111)
+            for label, df in curves:
+                if kind == 'Transfer':
+                    self.ax1.semilogy(df['Gate Voltage [V]'],
+                                      abs(df['Channel Current [A]']), '.',
+                                      label=label)
+                else:
+                    self.ax1.plot(df['Channel Voltage [V]'],
+                                  df['Channel Current [A]'], '.',
+                                  label=label)
+            if kind == 'Transfer':
+                self.ax1.set_title('Transfer curves')
+                self.ax1.set_xlabel('Gate Voltage [V]')
+            else:
+                self.ax1.set_title('Output curves')
+                self.ax1.set_xlabel('Channel Voltage [V]')
+            self.ax1.set_ylabel('Channel Current [A]')
+            if 0 < len(curves) <= 20:
+                self.ax1.legend(fontsize='small')
+            self.fig.tight_layout()
+            FigureCanvas.draw(self)
+
         def clear(self):
             """Clear the plot."""
             self.fig.clear()
             FigureCanvas.draw(self)
 
 
+class compareWindow(QWidget):
+        """Window overlaying transfer or output curves from many devices."""
+
+        def __init__(self):
+            """Initialise setup."""
+            super().__init__()
+            self.data = {}  # file name: downsampled data
+            self.pool = QThreadPool()
+            self.popupWarning = warningWindow()
+            self.initWidget()
+
+        def initWidget(self):
+            """Initialise connections."""
+            # Set widget layout
+            grid = QGridLayout()
+            self.setLayout(grid)
+
+            # Plot and its toolbar
+            self.plot = mplWidget()
+            grid.addWidget(self.plot, 1, 1, 1, 3)
+            grid.addWidget(mplToolb(self.plot, self), 2, 1, 1, 3)
+
+            # Files in the comparison, untick to hide a device
+            self.fileList = QListWidget()
+            self.fileList.itemChanged.connect(self.redraw)
+            grid.addWidget(self.fileList, 1, 4, 2, 1)
+
+            # Controls
+            self.kindBox = QComboBox()
+            self.kindBox.addItems(['Transfer', 'Output'])
+            self.kindBox.currentIndexChanged.connect(self.redraw)
+            grid.addWidget(self.kindBox, 3, 1)
+            addButton = QPushButton('Add files')
+            addButton.clicked.connect(self.addFiles)
+            grid.addWidget(addButton, 3, 2)
+            clearButton = QPushButton('Clear')
+            clearButton.clicked.connect(self.clearFiles)
+            grid.addWidget(clearButton, 3, 3)
+
+            # Window setup
+            self.resize(1000, 600)
+            self.setWindowTitle('K2636 - Compare devices')
+
+        def addFiles(self):
+            """Pop up for selecting files to add to the comparison."""
+            fnames = QFileDialog.getOpenFileNames(self, 'Add files',
+                                                  filter='*.csv')
+            for fname in fnames[0]:
+                if fname in self.data:
+                    continue
+                worker = fileLoader(fname, self.plot.width())
+                worker.signals.loaded.connect(self.fileLoaded)
+                worker.signals.failed.connect(self.fileFailed)
+                self.pool.start(worker)
+
+        def fileLoaded(self, fname, df):
+            """Add a loaded file to the list and redraw."""
+            self.data[fname] = df
+            item = QListWidgetItem(os.path.basename(fname))
+            item.setData(Qt.UserRole, fname)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            self.fileList.addItem(item)
+            self.redraw()
+
+        def fileFailed(self, fname, message):
+            """Report a file that could not be read."""
+            self.popupWarning.showWindow('Could not read %s' %
+                                         os.path.basename(fname))
+
+        def clearFiles(self):
+            """Remove all files from the comparison."""
+            self.data = {}
+            self.fileList.clear()
+            self.redraw()
+
+        def redraw(self, *args):
+            """Overlay the ticked files of the chosen measurement type."""
+            kind = self.kindBox.currentText()
+            pattern = '*transfer.csv' if kind == 'Transfer' else '*output.csv'
+            curves = []
+            for row in range(self.fileList.count()):
+                item = self.fileList.item(row)
+                fname = item.data(Qt.UserRole)
+                if (item.checkState() == Qt.Checked and
+                        fnmatch.fnmatch(fname, pattern)):
+                    curves.append((item.text()[:-4], self.data[fname]))
+            try:
+                self.plot.drawCompare(curves, kind)
+            except KeyError:
+                self.plot.clear()
+
+
 class keithleySettingsWindow(QWidget):
         """Keithley settings popup."""
 
@@ -577,15 +809,14 @@ class keithleyErrorWindow(QWidget):
                       (screen.height()-size.height()) / 2)
 
         def readError(self):
-            """Reconnect to instrument."""
+            """Read every entry in the instrument error queue."""
             self.keithley = k2636.K2636(address='ASRL/dev/ttyUSB0',
                                         read_term='\n', baudrate=57600)
-
-            self.keithley._write('errorCode, message, severity, errorNode' +
-                                 '= errorqueue.next()')
-            self.keithley._write('print(errorCode, message)')
-            error = self.keithley._query('')
-            self.errorStatus.append(error)
+            errors = self.keithley.readErrors()
+            for code, message in errors:
+                self.errorStatus.append('%d\t%s' % (code, message))
+            if not errors:
+                self.errorStatus.append('No errors.')
             self.keithley.closeConnection()
 
 
@@ -0,0 +1,158 @@
+"""
+Module for rendering summary figures of many samples without a display.
+
+Each sample gets the same 2x2 figure as the CLI (IV sweep, output
+curves, transfer curves and gate leakage), drawn with the Agg backend
+and saved as PNG or PDF. Building a matplotlib figure costs far more
+than drawing into one, so every worker process builds one
+figureTemplate and only swaps the data of its lines for each sample.
+Samples are shared between processes in a pool:
+
+    python report.py data/ --format pdf --workers 8
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import os
+import click
+from functools import partial
+
+# Files making up an ALL measurement of one sample
+SUFFIXES = ['-iv-sweep.csv', '-output.csv', '-neg-pos-transfer.csv',
+            '-pos-neg-transfer.csv']
+
+
+class figureTemplate():
+    """Reusable 2x2 summary figure; draw() just replaces its data."""
+
+    def __init__(self, width=10, height=8, dpi=80):
+        """Build the figure, axes and empty lines once."""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+        FigureCanvasAgg(self.fig)
+        ax1, ax2, ax3, ax4 = [self.fig.add_subplot(221 + i) for i in range(4)]
+        ax1.set_title('I-V sweep')
+        ax1.set_xlabel('Channel Voltage [V]')
+        ax1.set_ylabel('Channel Current [$\\mu$A]')
+        ax2.set_title('Output curves')
+        ax2.set_xlabel('Channel Voltage [V]')
+        ax2.set_ylabel('Channel Current [$\\mu$A]')
+        ax3.set_title('Transfer Curves')
+        ax3.set_xlabel('Gate Voltage [V]')
+        ax3.set_ylabel('Channel Current [A]')
+        ax3.set_yscale('log')
+        ax4.set_title('Gate leakage current')
+        ax4.set_xlabel('Gate Voltage [V]')
+        ax4.set_ylabel('Gate Leakage [nA]')
+        self.axes = [ax1, ax2, ax3, ax4]
+        self.lines = [ax1.plot([], [], '.')[0], ax2.plot([], [], '.')[0],
+                      ax3.plot([], [], '.')[0], ax3.plot([], [], '.')[0],
+                      ax4.plot([], [], '.')[0]]
+        self.title = self.fig.suptitle('')
+        self.fig.tight_layout(rect=(0, 0, 1, 0.96))
+
+    def draw(self, dfs, title=''):
+        """Show iv, output and both transfer DataFrames (None if missing)."""
+        iv, output, forward, reverse = dfs
+        data = [(iv, 'Channel Voltage [V]', 'Channel Current [A]', 1e-6),
+                (output, 'Channel Voltage [V]', 'Channel Current [A]', 1e-6),
+                (forward, 'Gate Voltage [V]', 'Channel Current [A]', None),
+                (reverse, 'Gate Voltage [V]', 'Channel Current [A]', None),
+                (forward, 'Gate Voltage [V]', 'Gate Leakage [A]', 1e-9)]
+        for line, (df, x, y, unit) in zip(self.lines, data):
+            if df is None:
+                line.set_data([], [])
+            elif unit is None:
+                line.set_data(df[x].values, abs(df[y].values))
+            else:
+                line.set_data(df[x].values, df[y].values / unit)
+        for ax in self.axes:
+            if any(len(line.get_xdata()) for line in ax.get_lines()):
+                ax.set_autoscale_on(True)
+                ax.relim()
+                ax.autoscale_view()
+            else:  # don't keep the limits of the last sample
+                ax.set_xlim(0, 1)
+                ax.set_ylim(0.1 if ax.get_yscale() == 'log' else 0, 1)
+        self.title.set_text(title)
+
+    def save(self, fname):
+        """Save as PNG or PDF, following the file extension."""
+        self.fig.savefig(fname)
+
+
+def findSamples(directory):
+    """Return the path prefix of every sample with data in directory."""
+    samples = set()
+    for fname in os.listdir(str(directory)):
+        for end in SUFFIXES:
+            if fname.endswith(end):
+                samples.add(os.path.join(str(directory), fname[:-len(end)]))
+    return sorted(samples)
+
+
+def readSample(sample):
+    """Read the data files of a sample, with None for any missing."""
+    import dataCache
+    dfs = []
+    for end in SUFFIXES:
+        try:
+            dfs.append(dataCache.read(str(sample + end)))
+        except FileNotFoundError:
+            dfs.append(None)
+    return dfs
+
+
+_template = None  # figure reused by every render in this process
+
+
+def renderSample(sample, fmt='png', outdir=None):
+    """Render the summary figure of a sample and return its file name."""
+    global _template
+    if _template is None:
+        _template = figureTemplate()
+    _template.draw(readSample(sample), os.path.basename(sample))
+    fname = str(sample + '.' + fmt)
+    if outdir is not None:
+        fname = os.path.join(str(outdir), os.path.basename(fname))
+    _template.save(fname)
+    return fname
+
+
+def renderAll(directory, fmt='png', workers=None, outdir=None):
+    """Render every sample in directory on a pool of processes.
+
+    Returns the file names of the figures. workers defaults to the
+    number of CPUs; with one CPU, or workers=1, samples are rendered in
+    this process. Workers are spawned rather than forked, so they never
+    inherit this process's figure.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    samples = findSamples(directory)
+    if outdir is not None:
+        os.makedirs(str(outdir), exist_ok=True)
+    render = partial(renderSample, fmt=fmt, outdir=outdir)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [render(sample) for sample in samples]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(
+            'spawn')) as pool:
+        chunk = max(1, len(samples) // (4 * workers))
+        return list(pool.map(render, samples, chunksize=chunk))
+
+
+@click.command()
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--format', 'fmt', default='png', type=click.Choice(['png', 'pdf']), help='Figure file format.')
+@click.option('--workers', default=None, type=int, help='Number of processes, default one per CPU.')
+@click.option('--outdir', default=None, help='Folder for figures, default next to the data.')
+def main(directory, fmt, workers, outdir):
+    '''Render summary figures of every sample in a directory.'''
+    fnames = renderAll(directory, fmt, workers, outdir)
+    print('Rendered %d figures.' % len(fnames))
+
+
+if __name__ == '__main__':
+    main()
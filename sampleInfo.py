@@ -0,0 +1,104 @@
+"""
+Module for sample metadata saved alongside the measurement files.
+
+Each sample has a JSON file <sample>-info.json next to its data, holding
+device details such as the channel geometry and position on the
+substrate:
+
+    {"Length [um]": 50, "Width [um]": 1000,
+     "Substrate": "W01", "Row": 3, "Column": 12,
+     "measurements": {"transfer neg-pos": {"output": "ofet1-neg-pos-transfer.csv",
+                                           "time": "2019-01-10 12:00:00"}}}
+
+The driver adds an entry under measurements, with whatever details it
+was given in K2636.info, each time it saves a measurement. Samples named
+exactly like W01-R03-C12 (substrate, row and column) get their position
+from the name; derived samples such as W01-R03-C12-stress-3600s do not.
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import os
+import re
+import json
+import time
+
+# Standard keys for device geometry, in micrometres
+LENGTH = 'Length [um]'
+WIDTH = 'Width [um]'
+# Standard keys for the position of a device on its substrate
+SUBSTRATE = 'Substrate'
+ROW = 'Row'
+COLUMN = 'Column'
+DEVICE_NAME = re.compile(r'(?P<substrate>.+?)[-_]R(?P<row>\d+)[-_]?'
+                         r'C(?P<column>\d+)$', re.IGNORECASE)
+
+
+def deviceName(substrate, row, column):
+    """Return the sample name of the device at row, column of a substrate."""
+    return '%s-R%02d-C%02d' % (substrate, int(row), int(column))
+
+
+def parseDevice(sample):
+    """Return the substrate, row and column in a sample name, if any."""
+    match = DEVICE_NAME.match(os.path.basename(str(sample)))
+    if match is None:
+        return {}
+    return {SUBSTRATE: match.group('substrate'),
+            ROW: int(match.group('row')),
+            COLUMN: int(match.group('column'))}
+
+
+def details(length=None, width=None, substrate=None, row=None, column=None):
+    """Return device details, leaving out any not given.
+
+    length and width are the channel size in um; substrate, row and
+    column place the device on its substrate.
+    """
+    given = {LENGTH: length, WIDTH: width, SUBSTRATE: substrate,
+             ROW: row, COLUMN: column}
+    return {key: value for key, value in given.items() if value is not None}
+
+
+def infoFile(sample):
+    """Return the name of the metadata file of a sample."""
+    return str(sample) + '-info.json'
+
+
+def load(sample):
+    """Read the metadata of a sample, or an empty dict if there is none."""
+    try:
+        with open(infoFile(sample), mode='r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        print('INFO ERROR: Could not read %s.' % infoFile(sample))
+        return {}
+
+
+def save(sample, info):
+    """Write the metadata of a sample atomically."""
+    tmp = infoFile(sample) + '.tmp'
+    with open(tmp, mode='w') as f:
+        json.dump(info, f, indent=1)
+    os.replace(tmp, infoFile(sample))
+
+
+def record(sample, measurement, direction, output, details=None, **extra):
+    """Add a saved measurement, and device details, to a sample's metadata.
+
+    details, e.g. {'Length [um]': 50, 'Width [um]': 1000}, update the
+    device entries, after any position found in the sample name; extra
+    keyword arguments are stored with the measurement.
+    """
+    info = load(sample)
+    info.update(parseDevice(sample))
+    info.update(details or {})
+    entry = {'output': str(output),
+             'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+    entry.update(extra)
+    key = ('%s %s' % (measurement, direction)).strip()
+    info.setdefault('measurements', {})[key] = entry
+    save(sample, info)
+    return info
@@ -0,0 +1,89 @@
+"""
+Module for planning the order of points in an output-curve family.
+
+output-charact.tsp measures every Vd sweep from Vdmin, waiting 5 s after
+each gate step, 2 s after jumping Vd back to the start and SettleDelay
+after every reading. plan() instead alternates the direction of the Vd
+sweeps (serpentine), so consecutive points never need a big jump, and
+sizes every wait to the voltage change before it:
+
+    wait = max(SettleDelay, GateSettle * |dVg|, DrainSettle * |dVd|)
+
+with GateSettle and DrainSettle in seconds per volt, and each term no
+longer than the fixed wait of the script (5 s and 2 s). The defaults
+reach those waits for a 10 V gate step and an 80 V drain jump. Each
+point carries its index in the usual order, so measured data can be put
+back into that order.
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import tsp
+
+# Planner settings, in the same units as the TSP parameters
+PLANNER = {'SettleDelay': 0.4, 'GateSettle': 0.5, 'DrainSettle': 0.025}
+# Waits of output-charact.tsp, for comparison
+NAIVE_GATE_WAIT = 5
+NAIVE_DRAIN_WAIT = 2
+# Parameters of output-charact.tsp that set the voltages
+LEVELS = ('Vdmin', 'Vdmax', 'Vdstep', 'Vgmin', 'Vgmax', 'Vgstep')
+
+
+def levels(params=None):
+    """Return the gate and drain voltages of output-charact.tsp."""
+    p = tsp.get_params(tsp.read_tsp('output-charact.tsp'))
+    p.update(params or {})
+    vg = [g * p['Vgstep'] for g in range(int(p['Vgmin']), int(p['Vgmax']) + 1)]
+    vd = [d * p['Vdstep'] for d in range(int(p['Vdmin']), int(p['Vdmax']) + 1)]
+    return vg, vd
+
+
+def naiveTime(vg, vd, settle=PLANNER['SettleDelay']):
+    """Total waiting time of output-charact.tsp in seconds."""
+    return len(vg) * (NAIVE_GATE_WAIT + NAIVE_DRAIN_WAIT + len(vd) * settle)
+
+
+def plan(vg, vd, serpentine=True, settle=PLANNER['SettleDelay'],
+         gate_settle=PLANNER['GateSettle'],
+         drain_settle=PLANNER['DrainSettle']):
+    """Plan the points of an output family.
+
+    Returns a dict of equal length lists: 'Vg', 'Vd', 'Wait' (seconds to
+    wait after setting the point) and 'Order' (index of the point in the
+    usual order, Vd sweeps from Vdmin for each Vg in turn).
+    """
+    points = {'Vg': [], 'Vd': [], 'Wait': [], 'Order': []}
+    last_g, last_d = 0.0, 0.0  # both sources start at 0 V
+    for i, g in enumerate(vg):
+        sweep = list(enumerate(vd))
+        if serpentine and i % 2:
+            sweep.reverse()
+        for j, d in sweep:
+            points['Wait'].append(max(
+                settle,
+                min(NAIVE_GATE_WAIT, gate_settle * abs(g - last_g)),
+                min(NAIVE_DRAIN_WAIT, drain_settle * abs(d - last_d))))
+            points['Vg'].append(g)
+            points['Vd'].append(d)
+            points['Order'].append(i * len(vd) + j)
+            last_g, last_d = g, d
+    return points
+
+
+def restore(df, order):
+    """Put rows measured in planned order back into the usual order.
+
+    If the sweep stopped early only the measured points are returned.
+    """
+    df = df.copy()
+    df.index = order[:len(df)]
+    return df.sort_index().reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    """Report the time saved for the default output family."""
+    vg, vd = levels()
+    planned = sum(plan(vg, vd)['Wait'])
+    naive = naiveTime(vg, vd)
+    print('%d points: %.1f s of waiting instead of %.1f s, %.1f s saved.'
+          % (len(vg) * len(vd), planned, naive, naive - planned))
@@ -0,0 +1,114 @@
+"""
+Module for reading continuous measurements streamed by TSP-scripts/stream.tsp.
+
+The script fills smua.nvbuffer1 and smua.nvbuffer2 in turn. Whenever one
+is full it is printed and cleared while the other fills, as
+
+    CHUNK <chunk number> <index of first reading> <readings> <base time>
+    <timestamp>, <reading>, <timestamp>, <reading>, ...
+
+and the run ends with 'END <chunks> <readings>'. readChunks checks the
+chunk and reading counters as it goes, so a lost chunk or reading is an
+error rather than a silent gap in the data.
+
+Running this module streams a long simulated run through readChunks and
+checks that every reading arrives, and that a dropped chunk is caught:
+
+    python stream.py
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import random
+
+
+class StreamError(IOError):
+    """Readings were lost between the instrument and the host."""
+
+
+def readChunks(read):
+    """Yield (times, readings) for each chunk of a stream.
+
+    read is a function returning the next line sent by the instrument.
+    Times are in seconds from the first reading of the run.
+    """
+    chunks, received, start = 0, 0, None
+    while True:
+        header = read().split()
+        if header and header[0] == 'END':
+            if int(header[1]) != chunks or int(header[2]) != received:
+                raise StreamError('Stream sent %s chunks, %s readings; '
+                                  'received %d chunks, %d readings.'
+                                  % (header[1], header[2], chunks, received))
+            return
+        if len(header) != 5 or header[0] != 'CHUNK':
+            raise StreamError('Unexpected line in stream: %s' % ' '.join(header))
+        number, first, n = int(header[1]), int(header[2]), int(header[3])
+        base = float(header[4])
+        if number != chunks or first != received:
+            raise StreamError('Expected chunk %d from reading %d, got chunk '
+                              '%d from reading %d.'
+                              % (chunks, received, number, first))
+        values = [float(x) for x in read().split(',')] if n else []
+        if len(values) != 2 * n:
+            raise StreamError('Chunk %d should hold %d readings, got %d.'
+                              % (number, n, len(values) // 2))
+        if start is None:
+            start = base
+        times = [base - start + t for t in values[0::2]]
+        yield times, values[1::2]
+        chunks += 1
+        received += n
+
+
+class simulatedStream():
+    """Stand-in for a 2636 running stream.tsp, sending lines to read().
+
+    drop gives the number of a chunk to lose on the way, to check that
+    the loss is detected.
+    """
+
+    def __init__(self, readings, chunk=100, interval=0.1, drop=None):
+        """Store run length and buffer size."""
+        self.lines = self._lines(readings, chunk, interval, drop)
+
+    def _lines(self, readings, chunk, interval, drop):
+        """Generate the lines stream.tsp would print."""
+        sent, number = 0, 0
+        while sent < readings:
+            n = min(chunk, readings - sent)
+            values = []
+            for i in range(n):
+                values += ['%.6e' % (i * interval),
+                           '%.6e' % random.gauss(1e-9, 1e-12)]
+            if number != drop:
+                yield ('CHUNK %d %d %d %.6f'
+                       % (number, sent, n, sent * interval))
+                yield ', '.join(values)
+            number += 1
+            sent += n
+        yield 'END %d %d' % (number, sent)
+
+    def read(self):
+        """Return the next line from the simulated instrument."""
+        return next(self.lines)
+
+
+if __name__ == '__main__':
+    """Check that a simulated long run arrives without dropped readings."""
+    readings = 1000003  # far more than fits in the instrument buffers
+    times = []
+    for t, i in readChunks(simulatedStream(readings, chunk=5000).read):
+        times += t
+    assert len(times) == readings
+    assert all(b > a for a, b in zip(times, times[1:]))
+    print('Received all %d readings in order.' % len(times))
+
+    try:
+        for t, i in readChunks(simulatedStream(20000, chunk=5000,
+                                               drop=2).read):
+            pass
+    except StreamError as e:
+        print('Dropped chunk detected: %s' % e)
+    else:
+        raise AssertionError('Dropped chunk was not detected.')
@@ -0,0 +1,120 @@
+"""
+Module for transfer-length method (TLM) extraction over sets of devices.
+
+For devices that differ only in channel length L, the width-normalised
+total resistance at each gate voltage is
+
+    R W = Rc W + Rsheet L
+
+so a straight line fit against L gives the contact resistance (times
+width, from the intercept) and the channel sheet resistance (the
+slope). Every device's transfer curve is interpolated onto a common
+gate voltage grid and the fits for all gate voltages are made at once
+with a single least squares solve. Geometry comes from each sample's
+info file (see sampleInfo.py):
+
+    python tlm.py tlm-L10 tlm-L20 tlm-L50 tlm-L100 --output tlm.csv
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import click
+import numpy as np
+import sampleInfo
+
+
+def normalisedResistance(vg, curves, widths):
+    """Width-normalised resistance of each device at gate voltages vg.
+
+    curves is a list of (Vg, Vd, Id) arrays, one per device, and widths
+    their channel widths. Returns an array of R W [ohm um], one row per
+    device and one column per gate voltage.
+    """
+    rw = np.empty((len(curves), len(vg)))
+    for i, (g, d, current) in enumerate(curves):
+        order = np.argsort(g)
+        r = np.asarray(d, dtype=float) / np.asarray(current, dtype=float)
+        rw[i] = np.interp(vg, np.asarray(g)[order], r[order],
+                          left=np.nan, right=np.nan)
+    return rw * np.asarray(widths, dtype=float)[:, None]
+
+
+def fit(lengths, rw):
+    """Fit R W = Rc W + Rsheet L for every column of rw at once.
+
+    Returns contact resistance times width [ohm um], sheet resistance
+    [ohm/sq] and the R squared of each fit. Columns with a missing value
+    for any device give NaN.
+    """
+    lengths = np.asarray(lengths, dtype=float)
+    A = np.column_stack([np.ones_like(lengths), lengths])
+    good = ~np.isnan(rw).any(axis=0)
+    coef = np.full((2, rw.shape[1]), np.nan)
+    r2 = np.full(rw.shape[1], np.nan)
+    if good.any() and len(set(lengths)) > 1:
+        coef[:, good], residual, rank, sv = np.linalg.lstsq(A, rw[:, good],
+                                                            rcond=None)
+        fitted = A @ coef[:, good]
+        ss_res = ((rw[:, good] - fitted) ** 2).sum(axis=0)
+        ss_tot = ((rw[:, good] - rw[:, good].mean(axis=0)) ** 2).sum(axis=0)
+        r2[good] = 1 - ss_res / np.where(ss_tot > 0, ss_tot, np.nan)
+    return coef[0], coef[1], r2
+
+
+def extract(samples, points=201, suffix='-neg-pos-transfer.csv'):
+    """TLM extraction from the transfer curves of samples.
+
+    Each sample needs 'Length [um]' and 'Width [um]' in its info file.
+    Returns a DataFrame of contact and sheet resistance against gate
+    voltage over the range all the devices were measured on. Results are
+    cached until any of the data or info files change.
+    """
+    import dataCache
+    for sample in samples:
+        info = sampleInfo.load(sample)
+        if sampleInfo.LENGTH not in info or sampleInfo.WIDTH not in info:
+            raise ValueError('No channel length and width for %s' % sample)
+    fnames = [f for s in samples
+              for f in (str(s + suffix), sampleInfo.infoFile(s))]
+    return dataCache.default().get(fnames, 'tlm', _extract,
+                                   samples=list(samples), points=points,
+                                   suffix=suffix)
+
+
+def _extract(fnames, samples, points, suffix):
+    """Uncached TLM extraction; fnames are only used for the cache key."""
+    import pandas as pd
+    import dataCache
+    lengths, widths, curves = [], [], []
+    for sample in samples:
+        info = sampleInfo.load(sample)
+        df = dataCache.read(str(sample + suffix))
+        lengths.append(info[sampleInfo.LENGTH])
+        widths.append(info[sampleInfo.WIDTH])
+        curves.append((df['Gate Voltage [V]'].values,
+                       df['Channel Voltage [V]'].values,
+                       df['Channel Current [A]'].values))
+    low = max(c[0].min() for c in curves)
+    high = min(c[0].max() for c in curves)
+    vg = np.linspace(low, high, points)
+    rcw, rsheet, r2 = fit(lengths, normalisedResistance(vg, curves, widths))
+    return pd.DataFrame({'Gate Voltage [V]': vg,
+                         'Contact Resistance [Ohm cm]': rcw * 1e-4,
+                         'Sheet Resistance [Ohm/sq]': rsheet,
+                         'R squared': r2})
+
+
+@click.command()
+@click.argument('samples', nargs=-1, required=True)
+@click.option('--output', default='tlm.csv', help='File to save results to.')
+@click.option('--suffix', default='-neg-pos-transfer.csv', help='Transfer curve file of each sample.')
+def main(samples, output, suffix):
+    '''Extract contact and sheet resistance from devices of different length.'''
+    df = extract(samples, suffix=suffix)
+    df.to_csv(output, sep='\t', index=False)
+    print(df.iloc[::max(1, len(df) // 10)].to_string(index=False))
+    print('Saved: ', output)
+
+
+if __name__ == '__main__':
+    main()
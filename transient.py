@@ -0,0 +1,85 @@
+"""
+Module for extracting switching times from sampled transient waveforms.
+
+Everything works on whole arrays at once: an edge is wherever a waveform
+passes from below its low threshold (10 % of its swing by default) to
+above its high threshold (90 %), or back, with thresholds found from the
+waveform itself. Rise and fall times run between the interpolated
+threshold crossings; propagation delays between the 50 % crossings of an
+input edge and the output edge that follows it.
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import numpy as np
+
+
+def _crossing(t, v, i, level):
+    """Interpolate the time v crosses level between samples i and i+1."""
+    dv = v[i + 1] - v[i]
+    frac = np.where(dv != 0, (level - v[i]) / np.where(dv != 0, dv, 1), 0)
+    return t[i] + frac * (t[i + 1] - t[i])
+
+
+def edges(t, v, low=0.1, high=0.9):
+    """Find the edges in a waveform v sampled at times t.
+
+    Returns a DataFrame with one row per edge giving its direction
+    ('rising' or 'falling'), the time of its 50 % crossing and its
+    transition (10-90 % rise or 90-10 % fall) time.
+    """
+    import pandas as pd
+    t = np.asarray(t, dtype=float)
+    v = np.asarray(v, dtype=float)
+    vmin, vmax = np.percentile(v, [1, 99])
+    lo = vmin + low * (vmax - vmin)
+    mid = vmin + 0.5 * (vmax - vmin)
+    hi = vmin + high * (vmax - vmin)
+
+    # State is +1 above hi, -1 below lo and otherwise the last of these,
+    # so noise between the thresholds can't add spurious edges
+    state = np.where(v >= hi, 1, np.where(v <= lo, -1, 0))
+    last = np.maximum.accumulate(np.where(state != 0, np.arange(len(v)), 0))
+    state = state[last]
+    j = np.nonzero((state[:-1] != state[1:]) & (state[:-1] != 0))[0]
+    start = last[j]  # last sample on the old side of the edge
+    rising = state[j + 1] > 0
+
+    t_start = _crossing(t, v, start, np.where(rising, lo, hi))
+    t_end = _crossing(t, v, j, np.where(rising, hi, lo))
+    # 50 % crossing: first crossing of mid, in the edge's direction,
+    # after the edge leaves the old side
+    above = v >= mid
+    c = np.nonzero(above[:-1] != above[1:])[0]
+    up, down = c[above[c + 1]], c[~above[c + 1]]
+    k = np.where(rising,
+                 up[np.minimum(np.searchsorted(up, start), len(up) - 1)]
+                 if len(up) else 0,
+                 down[np.minimum(np.searchsorted(down, start),
+                                 len(down) - 1)] if len(down) else 0)
+    t_mid = _crossing(t, v, k, mid)
+
+    return pd.DataFrame({'Edge': np.where(rising, 'rising', 'falling'),
+                         'Time [s]': t_mid,
+                         'Transition Time [s]': t_end - t_start})
+
+
+def switching(t_in, v_in, t_out, v_out, low=0.1, high=0.9):
+    """Find output edges of a switching circuit and their delays.
+
+    Each output edge is paired with the last input edge before it; its
+    propagation delay is the time between their 50 % crossings. Returns
+    the output edges as from edges() plus 'Input Edge' and 'Propagation
+    Delay [s]' columns.
+    """
+    ins = edges(t_in, v_in, low, high)
+    outs = edges(t_out, v_out, low, high)
+    i = np.searchsorted(ins['Time [s]'].values, outs['Time [s]'].values) - 1
+    found = i >= 0
+    i = np.where(found, i, 0)
+    outs['Input Edge'] = np.where(found, ins['Edge'].values[i]
+                                  if len(ins) else '', '')
+    outs['Propagation Delay [s]'] = np.where(
+        found, outs['Time [s]'].values -
+        (ins['Time [s]'].values[i] if len(ins) else 0), np.nan)
+    return outs
@@ -4,16 +4,102 @@ Module for writing and parsing .tsp files.
 Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
 """
 
-import csv
-
-def read_tsp:
-	"""Method for reading a tsp file line by line."""
-	pass
-
-def write_tsp(file2write2, string2write, lineNo):
-	"""Write a string to a tsp file at specific line number."""
-	with file2write2 as open(file2write2, 'w'):
-		print(file2write2)
-		
-write_tsp(file2write2, string2write, lineNo)
-	
\ No newline at end of file
+import re
+
+tsp_dir = 'TSP-scripts/'  # Put all tsp scripts in this folder
+
+
+def read_tsp(tsp):
+    """Read a tsp file and return a list of its lines.
+
+    A line '--#include <file>' is replaced by the lines of that file, so
+    scripts can share code such as the sweep abort rules.
+    """
+    lines = []
+    with open(str(tsp_dir + tsp), mode='r') as f:
+        for line in f:
+            if line.startswith('--#include '):
+                lines.extend(read_tsp(line[len('--#include '):].strip()))
+            else:
+                lines.append(line)
+    return lines
+
+
+def lua_value(value):
+    """Format a python value as a Lua literal."""
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, str):
+        return '"' + value.replace('"', '\\"') + '"'
+    if isinstance(value, (list, tuple)):
+        items = [lua_value(v) for v in value]
+        # long tables over several lines, as script lines are limited
+        rows = [', '.join(items[i:i + 10]) for i in range(0, len(items), 10)]
+        return '{' + ',\n'.join(rows) + '}'
+    return repr(value)
+
+
+def set_params(lines, params):
+    """Replace the value of each 'Name = value' parameter line."""
+    lines = list(lines)
+    for name, value in params.items():
+        pattern = re.compile(r'^(\s*)' + re.escape(str(name)) + r'\s*=')
+        for i, line in enumerate(lines):
+            if pattern.match(line):
+                indent = pattern.match(line).group(1)
+                lines[i] = '%s%s = %s\n' % (indent, name, lua_value(value))
+                break
+        else:
+            print('ERROR: No parameter %s in tsp script.' % name)
+            raise KeyError(name)
+    return lines
+
+
+def get_params(lines):
+    """Return the numeric 'Name = value' parameters of a script as a dict."""
+    pattern = re.compile(r'^\s*([A-Za-z_]\w*)\s*=\s*([-+0-9.eE]+)\s*$')
+    params = {}
+    for line in lines:
+        match = pattern.match(line)
+        if match and match.group(1) not in params:
+            try:
+                params[match.group(1)] = float(match.group(2))
+            except ValueError:
+                pass
+    return params
+
+
+def reverse_params(params, start, end):
+    """Swap the start and end points of a sweep for the reverse scan."""
+    params = dict(params)
+    if start in params or end in params:
+        s, e = params.pop(start, None), params.pop(end, None)
+        if e is not None:
+            params[start] = e
+        if s is not None:
+            params[end] = s
+    return params
+
+
+def nplc_table(currents, levels=((1e-6, 0.1), (1e-8, 1), (0, 10))):
+    """Work out a per-reading NPLC schedule from a previous sweep.
+
+    levels are (current, nplc) pairs from high to low current; each
+    reading gets the NPLC of the first level its current reaches. Returns
+    sweep parameters for include/nplc-schedule.tsp.
+    """
+    table = []
+    for i in currents:
+        for level, nplc in levels:
+            if abs(i) >= level:
+                table.append(nplc)
+                break
+        else:
+            table.append(levels[-1][1])
+    return {'NplcMode': 2, 'NplcTable': table}
+
+
+def write_tsp(file2write2, lines):
+    """Write a list of lines to a tsp file."""
+    with open(str(file2write2), mode='w') as f:
+        f.writelines(lines)
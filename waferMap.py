@@ -0,0 +1,221 @@
+"""
+Module for summarising many devices by their position on the substrate.
+
+Every sample with a position (see sampleInfo.py) and a transfer curve is
+found in the folders given. The curves are packed into one NaN-padded
+array, one row per device, and the metrics of every device are worked
+out together:
+
+    On Current [A]          largest |Id|
+    Off Current [A]         smallest non-zero |Id|
+    On/Off Ratio            on / off current
+    Threshold Voltage [V]   sqrt|Id| extrapolated to zero from its
+                            steepest point
+    On Current [A/um]       on current per um of channel width
+
+Results are saved as a table, a heatmap of each metric for every
+substrate and histograms of each metric across substrates:
+
+    python waferMap.py data/ --outdir maps --format pdf
+
+Author:  Ross <peregrine dot warren at physics dot ox dot ac dot uk>
+"""
+
+import os
+import click
+import numpy as np
+import sampleInfo
+
+METRICS = ['On Current [A]', 'Off Current [A]', 'On/Off Ratio',
+           'Threshold Voltage [V]', 'On Current [A/um]']
+# Metrics spanning decades, drawn on log scales
+LOG_METRICS = ['On Current [A]', 'Off Current [A]', 'On/Off Ratio',
+               'On Current [A/um]']
+
+
+def findDevices(directories):
+    """Return the info of every sample with a position in directories.
+
+    Samples derived from a device, such as bias stress snapshots, share
+    its position; only the shortest sample name at each position, the
+    device itself, is kept.
+    """
+    devices = {}
+    for directory in directories:
+        for fname in sorted(os.listdir(str(directory))):
+            if not fname.endswith('-info.json'):
+                continue
+            sample = os.path.join(str(directory), fname[:-len('-info.json')])
+            info = sampleInfo.parseDevice(sample)
+            info.update(sampleInfo.load(sample))
+            try:
+                position = (str(info[sampleInfo.SUBSTRATE]),
+                            int(info[sampleInfo.ROW]),
+                            int(info[sampleInfo.COLUMN]))
+            except (KeyError, TypeError, ValueError):
+                continue
+            info['Sample'] = sample
+            if (position not in devices or
+                    len(sample) < len(devices[position]['Sample'])):
+                devices[position] = info
+    return [devices[position] for position in sorted(devices)]
+
+
+def packCurves(samples, suffix='-neg-pos-transfer.csv'):
+    """Read the transfer curve of each sample into NaN-padded arrays.
+
+    Returns Vg and |Id|, one row per sample; samples without a curve
+    give a row of NaN.
+    """
+    import dataCache
+    curves = []
+    for sample in samples:
+        try:
+            df = dataCache.read(str(sample + suffix))
+            curves.append((df['Gate Voltage [V]'].values,
+                           df['Channel Current [A]'].values))
+        except (FileNotFoundError, KeyError, ValueError):
+            curves.append((np.array([]), np.array([])))
+    length = max([len(vg) for vg, _ in curves] + [2])
+    vg = np.full((len(curves), length), np.nan)
+    current = np.full((len(curves), length), np.nan)
+    for i, (g, d) in enumerate(curves):
+        vg[i, :len(g)] = g
+        current[i, :len(d)] = abs(d)
+    return vg, current
+
+
+def metrics(vg, current, widths=None):
+    """Work out the metrics of every device from packed transfer curves.
+
+    widths gives the channel width of each device in um (NaN if not
+    known). Returns a dict of arrays, one value per device.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rows = np.arange(len(vg))
+        empty = np.isnan(current).all(axis=1)
+        on = np.where(empty, np.nan,
+                      np.max(np.where(np.isnan(current), -np.inf, current),
+                             axis=1))
+        positive = np.where(current > 0, current, np.inf)
+        off = np.min(positive, axis=1)
+        off[np.isinf(off)] = np.nan
+        # Steepest point of sqrt|Id| against Vg, extrapolated to zero
+        root = np.sqrt(current)
+        slope = np.diff(root, axis=1) / np.diff(vg, axis=1)
+        steepest = np.argmax(np.where(np.isfinite(slope), abs(slope), -1),
+                             axis=1)
+        g0 = (vg[rows, steepest] + vg[rows, steepest + 1]) / 2
+        r0 = (root[rows, steepest] + root[rows, steepest + 1]) / 2
+        threshold = g0 - r0 / slope[rows, steepest]
+        threshold[~np.isfinite(threshold)] = np.nan
+        if widths is None:
+            widths = np.full(len(vg), np.nan)
+        return {'On Current [A]': on,
+                'Off Current [A]': off,
+                'On/Off Ratio': on / off,
+                'Threshold Voltage [V]': threshold,
+                'On Current [A/um]': on / np.asarray(widths, dtype=float)}
+
+
+def aggregate(directories, suffix='-neg-pos-transfer.csv'):
+    """Return a DataFrame of position, geometry and metrics of devices."""
+    import pandas as pd
+    columns = ['Sample', sampleInfo.SUBSTRATE, sampleInfo.ROW,
+               sampleInfo.COLUMN, sampleInfo.LENGTH, sampleInfo.WIDTH]
+    df = pd.DataFrame(findDevices(directories))
+    df = df.reindex(columns=columns)
+    vg, current = packCurves(df['Sample'], suffix)
+    found = metrics(vg, current, df[sampleInfo.WIDTH].values)
+    for name in METRICS:
+        df[name] = found[name]
+    return df
+
+
+def heatmaps(df, substrate, fname):
+    """Save a heatmap of every metric over the devices of a substrate."""
+    from matplotlib.figure import Figure
+    from matplotlib.colors import LogNorm
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    devices = df[df[sampleInfo.SUBSTRATE] == substrate]
+    rows = devices[sampleInfo.ROW].astype(int).values
+    cols = devices[sampleInfo.COLUMN].astype(int).values
+    r0, c0 = rows.min(), cols.min()
+    fig = Figure(figsize=(12, 8), dpi=80)
+    FigureCanvasAgg(fig)
+    for i, name in enumerate(METRICS):
+        ax = fig.add_subplot(2, 3, i + 1)
+        grid = np.full((rows.max() - r0 + 1, cols.max() - c0 + 1), np.nan)
+        grid[rows - r0, cols - c0] = devices[name].values
+        values = grid[np.isfinite(grid) & (grid > 0)]
+        norm = None
+        if name in LOG_METRICS and len(values):
+            norm = LogNorm(values.min(), values.max())
+        image = ax.imshow(grid, norm=norm, cmap='viridis', origin='upper',
+                          extent=(c0 - 0.5, cols.max() + 0.5,
+                                  rows.max() + 0.5, r0 - 0.5))
+        fig.colorbar(image, ax=ax)
+        ax.set_title(name)
+        ax.set_xlabel('Column')
+        ax.set_ylabel('Row')
+    fig.suptitle('%s: %d devices' % (substrate, len(devices)))
+    fig.tight_layout(rect=(0, 0, 1, 0.95))
+    fig.savefig(fname)
+
+
+def distributions(df, fname, bins=40):
+    """Save histograms of every metric, one colour per substrate."""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(12, 8), dpi=80)
+    FigureCanvasAgg(fig)
+    for i, name in enumerate(METRICS):
+        ax = fig.add_subplot(2, 3, i + 1)
+        values = df[name].values
+        good = np.isfinite(values)
+        if name in LOG_METRICS:
+            good &= values > 0
+        if not good.any():
+            ax.set_title(name)
+            continue
+        if name in LOG_METRICS:
+            edges = np.logspace(np.log10(values[good].min()),
+                                np.log10(values[good].max()) + 1e-9, bins)
+            ax.set_xscale('log')
+        else:
+            edges = np.linspace(values[good].min(),
+                                values[good].max() + 1e-9, bins)
+        for substrate, group in df[good].groupby(sampleInfo.SUBSTRATE):
+            ax.hist(group[name].values, edges, histtype='step',
+                    label=str(substrate))
+        ax.set_title(name)
+        ax.set_ylabel('Devices')
+    fig.axes[0].legend(fontsize='small')
+    fig.tight_layout()
+    fig.savefig(fname)
+
+
+@click.command()
+@click.argument('directories', nargs=-1, required=True, type=click.Path(exists=True, file_okay=False))
+@click.option('--outdir', default='.', help='Folder for the table and figures.')
+@click.option('--format', 'fmt', default='png', type=click.Choice(['png', 'pdf']), help='Figure file format.')
+@click.option('--suffix', default='-neg-pos-transfer.csv', help='Transfer curve file of each sample.')
+def main(directories, outdir, fmt, suffix):
+    '''Map device metrics over substrates and plot their distributions.'''
+    df = aggregate(directories, suffix)
+    if df.empty:
+        print('No devices with a substrate position found.')
+        return
+    os.makedirs(str(outdir), exist_ok=True)
+    df.to_csv(os.path.join(str(outdir), 'wafer-metrics.csv'), sep='\t',
+              index=False)
+    for substrate in sorted(df[sampleInfo.SUBSTRATE].unique(), key=str):
+        heatmaps(df, substrate,
+                 os.path.join(str(outdir), '%s-map.%s' % (substrate, fmt)))
+    distributions(df, os.path.join(str(outdir), 'distributions.%s' % fmt))
+    print(df.groupby(sampleInfo.SUBSTRATE)[METRICS].median().to_string())
+    print('Saved %d devices to %s' % (len(df), outdir))
+
+
+if __name__ == '__main__':
+    main()